@@ -0,0 +1,168 @@
+#!/usr/bin/env python -u
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the merge on synthetic splsensors logs.
+
+Time and peak memory (tracemalloc, main process) of process(), the streaming process(),
+combine_excel_files() and combine_excel_to_dfs() for several numbers of logs, with each
+reader engine (openpyxl, and calamine if installed). The merged frames of the engines are
+checked to be the same. The results are saved as JSON and can be compared with a previous
+run to catch the regressions:
+
+    python benchmarks/run_benchmark.py --sizes 10 100 1000 --output bench_new.json --compare bench_old.json
+"""
+import os, sys
+import io
+import json
+import time
+import argparse
+import datetime
+import platform
+import contextlib
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from mergexlsxspl import mergexlsxspl
+import splsensors_logs
+
+
+def target_process(folder, excel_names, jobs, engine):
+    mergexlsxspl.process(inputFolder=folder, jobs=jobs, engine=engine)
+
+def target_process_streaming(folder, excel_names, jobs, engine):
+    mergexlsxspl.process(inputFolder=folder, jobs=jobs, streaming=True)
+
+def target_combine_excel_files(folder, excel_names, jobs, engine):
+    sheet_names = [name for name in mergexlsxspl.get_sheet_names(excel_names[0]) if name != 'Summary_Process_Log']
+    return mergexlsxspl.combine_excel_files(excel_names, sheet_names, jobs=jobs, engine=engine)
+
+def target_combine_excel_to_dfs(folder, excel_names, jobs, engine):
+    mergexlsxspl.combine_excel_to_dfs(excel_names, 'Full_List', engine=engine)
+
+TARGETS = {
+    'process': target_process,
+    'process_streaming': target_process_streaming,
+    'combine_excel_files': target_combine_excel_files,
+    'combine_excel_to_dfs': target_combine_excel_to_dfs,
+}
+# The streaming merge always reads with openpyxl, it is run with the first reader only
+STREAMING_TARGETS = ['process_streaming']
+# Reader engines available here
+READERS = ['openpyxl'] + (['calamine'] if mergexlsxspl.CALAMINE_AVAILABLE else [])
+
+
+def same_frames(excel_names, readers, jobs):
+    """
+    Return True if combine_excel_files() gives the same values and dtypes with all the readers.
+    """
+    frames = [target_combine_excel_files(None, excel_names, jobs, engine) for engine in readers]
+    for other in frames[1:]:
+        for name, df in frames[0].items():
+            try:
+                pd.testing.assert_frame_equal(df, other[name])
+            except AssertionError as e:
+                print(f'[{name}] differs between the readers: {e}', flush=True)
+                return False
+    return True
+
+
+def measure(func, repeat, memory):
+    """
+    Return the best time of repeat runs and the peak memory (MB) of one traced run.
+    The output of the merge is not printed.
+    """
+    times = []
+    peak = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        if memory:
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+    return min(times), peak
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print the time ratio with a baseline run and return the list of regressions.
+    """
+    key = lambda r: (r['target'], r.get('reader', 'openpyxl'), r['files'], r['rows'], r['jobs'])
+    previous = {key(r): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        old = previous.get(key(r))
+        if old is None:
+            continue
+        ratio = r['seconds'] / old['seconds']
+        flag = ' <-- REGRESSION' if ratio > 1 + tolerance else ''
+        print(f"{r['target']:<22}{r['reader']:<10}{r['files']:>6} files  {old['seconds']:9.2f}s -> {r['seconds']:9.2f}s  x{ratio:5.2f}{flag}")
+        if flag:
+            regressions.append(r)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the merge on synthetic splsensors logs.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help='Numbers of logs to merge.')
+    parser.add_argument('--rows', type=int, default=100, help='Number of rows in Full_List of each log.')
+    parser.add_argument('--jobs', type=int, default=1, help='Parallel jobs given to the merge.')
+    parser.add_argument('--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS), help='Functions to benchmark.')
+    parser.add_argument('--readers', nargs='+', choices=READERS, default=READERS, help='Reader engines to benchmark.')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of timed runs (best is kept).')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='Do not measure the peak memory.')
+    parser.add_argument('--workdir', default=os.path.join('bench_data'), help='Folder of the synthetic logs (kept between runs).')
+    parser.add_argument('--output', default='bench_results.json', help='JSON file of the results.')
+    parser.add_argument('--compare', default=None, help='JSON file of a previous run to compare with.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Slowdown ratio reported as a regression.')
+    args = parser.parse_args()
+
+    results = []
+    same_readers = {}
+    for files in args.sizes:
+        folder = os.path.abspath(os.path.join(args.workdir, f'{files}_files_{args.rows}_rows'))
+        print(f'Generating {files} logs in {folder}', flush=True)
+        excel_names = splsensors_logs.make_logs(folder, files, args.rows)
+        for engine in args.readers:
+            for name in args.targets:
+                if name in STREAMING_TARGETS and engine != args.readers[0]:
+                    continue
+                reader = 'openpyxl' if name in STREAMING_TARGETS else engine
+                seconds, peak = measure(lambda: TARGETS[name](folder, excel_names, args.jobs, engine), args.repeat, args.memory)
+                results.append({'target': name, 'reader': reader, 'files': files, 'rows': args.rows, 'jobs': args.jobs,
+                                'seconds': seconds, 'peak_mb': peak})
+                peak_text = f'{peak:9.1f} MB' if peak is not None else ''
+                print(f'{name:<22}{reader:<10}{files:>6} files  {seconds:9.2f}s {peak_text}', flush=True)
+        if len(args.readers) > 1:
+            with contextlib.redirect_stdout(io.StringIO()):
+                same = same_frames(excel_names, args.readers, args.jobs)
+            same_readers[files] = same
+            print(f'Same frames with the readers {args.readers}: {same}', flush=True)
+
+    report = {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'cpu_count': os.cpu_count(),
+        'same_readers': same_readers,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results saved in {args.output}', flush=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python -u
+# -*- coding: utf-8 -*-
+"""
+Generator of synthetic splsensors logs (*_FINAL_Log.xlsx) for the benchmarks.
+
+The logs have the same sheets, in the same order, and the same columns than the
+Final logs of the splsensors tool, so they can be merged by mergexlsxspl.process().
+
+    python benchmarks/splsensors_logs.py D:\\Bench\\Logs --files 100 --rows 200
+"""
+import os
+import argparse
+import datetime
+import random
+
+import pandas as pd
+
+SENSORS = ['MBES', 'SSS', 'SBP', 'MAG', 'SUHRS']
+SENSOR_EXT = {'MBES': '.all', 'SSS': '.xtf', 'SBP': '.sgy', 'MAG': '.csv', 'SUHRS': '.xtf'}
+
+TRANSPOSED_COLUMNS = ['Session Start', 'Session End', 'Session Name', 'Session MaxGap', 'Vessel Name', 'SPL'] + SENSORS
+
+# Columns of each sheet, in the order of the Final logs (the index column is added by to_excel)
+SHEETS = {
+    'Summary_Process_Log': ['Process Log'],
+    'Full_List': ['Sensor Start', 'SPL Start', 'Session Start', 'Session End', 'Session Name', 'Session MaxGap',
+                  'Difference Start [s]', 'Vessel Name', 'Sensor Type', 'FilePath', 'Sensor FileName', 'SPL LineName',
+                  'SPL Name'],
+    'List_Transposed': TRANSPOSED_COLUMNS,
+    'Rename_LN': ['Sensor Start', 'Sensor FileName', 'New LineName', 'SPL LineName', 'Sensor Type', 'Vessel Name',
+                  'FilePath'],
+    'Missing_SPL': ['Sensor Start', 'Sensor FileName', 'Sensor Type', 'Vessel Name', 'FilePath'],
+    'MBES_NotMatching': TRANSPOSED_COLUMNS,
+    'SSS_NotMatching': TRANSPOSED_COLUMNS,
+    'SBP_NotMatching': TRANSPOSED_COLUMNS,
+    'MAG_NotMatching': TRANSPOSED_COLUMNS,
+    'SUHRS_NotMatching': TRANSPOSED_COLUMNS,
+    'Duplicated_SPL_Name': ['Session Start', 'Session End', 'Session Name', 'SPL'],
+    'Duplicated_Sensor_Data': ['Sensor Start', 'Sensor FileName', 'Sensor Type', 'FilePath'],
+    'SPL_Problem': ['Session Start', 'Session End', 'Session Name', 'SPL'],
+    'Skip_SSS_Files': ['Sensor FileName', 'Size [MB]', 'FilePath'],
+    'Wrong_SBP_Time': ['Sensor Start', 'Sensor FileName', 'FilePath'],
+}
+
+# Part of the Full_List rows found in the other sheets
+SHEET_RATIO = {'Summary_Process_Log': 0.0, 'Full_List': 1.0, 'List_Transposed': 0.5, 'Rename_LN': 1.0}
+DEFAULT_RATIO = 0.05
+
+
+def make_rows(rng, vessel, rows, start):
+    """
+    Return the Full_List like records of one vessel log.
+    """
+    records = []
+    session = start
+    for i in range(rows):
+        sensor = SENSORS[i % len(SENSORS)]
+        if i % len(SENSORS) == 0:
+            session = session + datetime.timedelta(minutes=rng.randint(20, 90))
+            session_name = int(session.strftime('%j%H%M'))
+            line_name = rng.choice(['L%04d' % rng.randint(1, 9999), 'NoLineNameFound', 'EmptySPL', 'SPLtoSmall']
+                                   if rng.random() < 0.05 else ['L%04d' % rng.randint(1, 9999)])
+        sensor_start = session + datetime.timedelta(seconds=rng.randint(-30, 300))
+        status = '[OK]' if rng.random() < 0.9 else '[WRONG]'
+        filename = '%s_%s_%s%s' % (vessel, line_name, sensor_start.strftime('%Y%m%d_%H%M%S'), SENSOR_EXT[sensor])
+        records.append({
+            'Sensor Start': sensor_start,
+            'SPL Start': session,
+            'Session Start': session,
+            'Session End': session + datetime.timedelta(minutes=rng.randint(10, 60)),
+            'Session Name': session_name,
+            'Session MaxGap': round(rng.expovariate(2.0), 3),
+            'Difference Start [s]': float(min(0, (session - sensor_start).total_seconds())),
+            'Vessel Name': vessel,
+            'Sensor Type': sensor,
+            'FilePath': 'D:\\Survey\\%s\\%s\\%s' % (vessel, sensor, filename),
+            'Sensor FileName': '%s %s' % (status, filename),
+            'SPL LineName': line_name,
+            'SPL Name': 'D:\\Survey\\%s\\SPL\\%s_FugroBrasilis-CRP-Position.fbz' % (vessel, line_name),
+            'New LineName': '%s_%s' % (vessel, line_name),
+            'SPL': line_name,
+            'Size [MB]': round(rng.uniform(0.01, 1.0), 2),
+            'Process Log': 'Synthetic log',
+        })
+        records[-1].update({s: ('%s %s' % (status, filename) if s == sensor else None) for s in SENSORS})
+    return records
+
+
+def make_log(path, rows, seed=0):
+    """
+    Write one synthetic Final log with rows records in Full_List.
+    """
+    rng = random.Random(seed)
+    vessel = 'FSV%02d' % (seed % 100)
+    records = pd.DataFrame(make_rows(rng, vessel, rows, datetime.datetime(2020, 1, 1) + datetime.timedelta(days=seed)))
+    with pd.ExcelWriter(path, engine='xlsxwriter') as writer:
+        for name, columns in SHEETS.items():
+            n = int(round(rows * SHEET_RATIO.get(name, DEFAULT_RATIO)))
+            df = records.iloc[:max(n, 1)][columns].reset_index(drop=True)
+            df.to_excel(writer, sheet_name=name)
+
+
+def make_logs(folder, files, rows, seed=0):
+    """
+    Write files synthetic logs in folder and return their paths. The logs already there are kept.
+    """
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for n in range(files):
+        path = os.path.join(folder, 'FSV%02d_%04d_FINAL_Log.xlsx' % ((seed + n) % 100, n))
+        if not os.path.exists(path):
+            make_log(path, rows, seed + n)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate synthetic splsensors Final logs.')
+    parser.add_argument('folder', help='Output folder of the logs.')
+    parser.add_argument('--files', type=int, default=10, help='Number of logs.')
+    parser.add_argument('--rows', type=int, default=100, help='Number of rows in Full_List of each log.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    args = parser.parse_args()
+    make_logs(args.folder, args.files, args.rows, args.seed)
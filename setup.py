@@ -12,14 +12,27 @@ with open('LICENSE') as f:
 install_requires = [
     'pandas',
     'glob3',
-    'gooey',
     'openpyxl',
+    'xlsxwriter',
 ]
 
 extras_require = {
+    'gui' : [
+        'gooey',
+    ],
     'build' : [
         'setuptools',
     ],
+    'cache' : [
+        'pyarrow',
+    ],
+    'fast' : [
+        'pandas>=2.2',
+        'python-calamine',
+    ],
+    'export' : [
+        'pyarrow',
+    ],
     'tests' : [],
 }
 
@@ -38,6 +51,14 @@ setup(
     license=license,
     packages=find_namespace_packages(where='src'),
     package_dir={'': 'src'},
+    entry_points={
+        'console_scripts': [
+            'mergexlsxspl = mergexlsxspl.mergexlsxspl:cli',
+        ],
+        'gui_scripts': [
+            'mergexlsxspl-gui = mergexlsxspl.mergexlsxspl:gui',
+        ],
+    },
     keywords='XLXS Merge Logs SPLTool',
     classifiers=[
         'Development Status :: 2 - Beta',
@@ -14,31 +14,138 @@ from builtins import *
 
 ##### Basic packages #####
 import pandas as pd
+from pandas.api.types import union_categoricals
 import glob
 import os, sys
+import argparse
 import datetime
+import io
+import math
+import re
+import zipfile
+import json
+import time
+import hashlib
+import fnmatch
+import posixpath
+import functools
+import warnings
+import collections
+import contextlib
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+import openpyxl
+import xlsxwriter
 from xlsxwriter.utility import xl_rowcol_to_cell
 
+##### Optional packages #####
+try:
+    import pyarrow # feather files for the parse cache, parquet/feather export
+except ImportError:
+    pyarrow = None
+try:
+    import python_calamine # fast xlsx reader (Rust), used by pandas for --reader calamine
+except ImportError:
+    python_calamine = None
+# The calamine engine of pandas is only available from pandas 2.2
+CALAMINE_AVAILABLE = python_calamine is not None and tuple(int(v) for v in pd.__version__.split('.')[:2]) >= (2, 2)
+
 ##### GUI packages #####
-from gooey import Gooey, GooeyParser
+# gooey is only imported when the GUI is launched, see gui()
 
 # 417574686f723a205061747269636520506f6e6368616e74
+
+# Logs to merge and output of each project folder
+LOG_PATTERN = '*_Log.xlsx'
+OUTPUT_NAME = 'sheets_combined.xlsx'
+# Archives of logs, read without extraction
+ARCHIVE_PATTERN = '*.zip'
+
+# SpreadsheetML namespace used by xl/workbook.xml
+XLSX_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+XLSX_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+XLSX_PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+# Rows limit of an Excel worksheet (1048576 with the header row), bigger sheets are split in shards
+EXCEL_MAX_ROWS = 1048575
+
+# Engines used by pandas to read the logs (auto: calamine if installed, openpyxl otherwise)
+READER_ENGINES = ['auto', 'calamine', 'openpyxl']
+
+# Columnar export formats
+EXPORT_FORMATS = ['parquet', 'feather', 'csv']
+
+# Schema of the logs: dtypes of the known columns, applied when the logs are read
+DATETIME_COLUMNS = ['Sensor Start', 'Session Start', 'Session End']
+COLUMN_DTYPES = dict({'Session MaxGap': 'float64',
+                      'Difference Start [s]': 'float64',
+                      'Session Name': 'category',
+                      'Sensor Type': 'category',
+                      'Vessel Name': 'category'},
+                     **dict.fromkeys(DATETIME_COLUMNS, 'datetime64'))
+# Columns of the known sheets used to format the combined workbook
+TRANSPOSED_SCHEMA = ['Session Start', 'Session End', 'Session Name', 'Session MaxGap', 'SPL']
+SHEET_SCHEMAS = {
+    'Full_List': ['Sensor Start', 'Session End', 'Session Name', 'Session MaxGap', 'Difference Start [s]', 'Sensor Type',
+                  'FilePath', 'Sensor FileName', 'SPL LineName'],
+    'List_Transposed': TRANSPOSED_SCHEMA,
+    'Rename_LN': ['Sensor Start', 'Sensor FileName', 'New LineName', 'SPL LineName', 'Sensor Type', 'Vessel Name', 'FilePath'],
+    'Missing_SPL': ['Sensor Start', 'Sensor FileName', 'Sensor Type', 'Vessel Name', 'FilePath'],
+    'MBES_NotMatching': TRANSPOSED_SCHEMA,
+    'SSS_NotMatching': TRANSPOSED_SCHEMA,
+    'SBP_NotMatching': TRANSPOSED_SCHEMA,
+    'MAG_NotMatching': TRANSPOSED_SCHEMA,
+    'SUHRS_NotMatching': TRANSPOSED_SCHEMA,
+}
+# Description of each sheet in the Summary_Process_Log
+SHEET_DESCRIPTIONS = {
+    'Full_List': ': Full log list of all sensors without duplicated and skip files. (Sensors Not Transposed)',
+    'List_Transposed': ': Log list of all sensors transposed and matching all sessions)',
+    'Rename_LN': ': Rename Sheet to be use if you just want to use the LineName option in the rename tool.)',
+    'Missing_SPL': ': List of all sensors that have missing SPL file.',
+    'MBES_NotMatching': ': MBES log list of all files that do not match the SPL name; without duplicated and skip files',
+    'SSS_NotMatching': ': SSS log list of all files that do not match the SPL name; without duplicated and skip files',
+    'SBP_NotMatching': ': SBP log list of all files that do not match the SPL name; without duplicated and skip files',
+    'MAG_NotMatching': ': MAG log list of all files that do not match the SPL name; without duplicated and skip files',
+    'SUHRS_NotMatching': ': SUHRS log list of all files that do not match the SPL name; without duplicated and skip files',
+    'Duplicated_SPL_Name': ': List of all duplicated SPL name',
+    'Duplicated_Sensor_Data': ': List of all duplicated sensors files; Based on the start time',
+    'SPL_Problem': ': List of all SPL session without a line name in the columns LineName, are empty or too small',
+    'Skip_SSS_Files': ': List of all SSS data that have a file size less than 1 MB',
+    'Wrong_SBP_Time': ': List of all SBP data that have a wrong timestamp',
+}
+# Sheets with the List_Transposed layout
+TRANSPOSED_SHEETS = ['List_Transposed', 'MBES_NotMatching', 'SSS_NotMatching', 'SBP_NotMatching', 'MAG_NotMatching',
+                     'SUHRS_NotMatching']
+# Sheets computed from the merged Full_List with --derive (the other sheets are read from the logs)
+DERIVED_SHEETS = TRANSPOSED_SHEETS + ['Duplicated_SPL_Name', 'SPL_Problem']
+# Full_List columns of a session (one row in the transposed sheets) and of a sensor file
+SESSION_KEYS = ['Session Start', 'Session Name', 'Vessel Name']
+SENSOR_FILE_KEYS = ['Sensor Type', 'Sensor Start']
+# SPL LineName of the sessions without a valid line name
+SPL_PROBLEMS = ['NoLineNameFound', 'EmptySPL', 'SPLtoSmall']
+# Part of the parse cache key, to be changed when the schema is changed
+SCHEMA_VERSION = '2'
+
+class SchemaDriftWarning(UserWarning):
+    """
+    A log does not match the schema of the known sheets.
+    """
+
 ##########################################################
 #                       Main code                        #
 ##########################################################
 # https://pythonpedia.com/en/knowledge-base/30635145/create-multiple-dataframes-in-loop
 
-# this needs to be *before* the @Gooey decorator!
-# (this code allows to only use Gooey when no arguments are passed to the script)
-if len(sys.argv) >= 2:
-    if not '--ignore-gooey' in sys.argv:
-        sys.argv.append('--ignore-gooey')
-        
+DESCRIPTION = "Merge XLSX from the splsensors tool"
+
 # Preparing your script for packaging https://chriskiehl.com/article/packaging-gooey-with-pyinstaller
 # Prevent stdout buffering # https://github.com/chriskiehl/Gooey/issues/289
 
 # GUI Configuration
-@Gooey(
+GOOEY_CONFIG = dict(
     program_name='Merge XLSX from the splsensors tool',
     richtext_controls=True,
     #richtext_controls=True,
@@ -69,74 +176,777 @@ if len(sys.argv) >= 2:
     )
 
 def main():
-    desc = "Merge XLSX from the splsensors tool"    
-    parser = GooeyParser(description=desc)
+    """
+    Use the GUI when no arguments are passed to the script, the command line otherwise.
+    """
+    if len(sys.argv) >= 2:
+        cli()
+    else:
+        gui()
+
+def cli(argv=None):
+    """
+    Command line entry point (plain argparse, Gooey and wx are not imported).
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    # Gooey relaunch the script with --ignore-gooey when the Start button is pressed
+    argv = [a for a in argv if a != '--ignore-gooey']
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.inputFolder is None and not args.batch:
+        parser.error('the following arguments are required: -i/--input (or -b/--batch)')
     
-    main = parser.add_argument_group('Main', gooey_options={'columns': 1})
-    main.add_argument(
+    now = datetime.datetime.now() # time the process
+    process(args)
+    print('', flush=True)
+    print("Process Duration: ", (datetime.datetime.now() - now), flush=True) # print the processing time. It is handy to keep an eye on processing performance.
+
+def gui():
+    """
+    GUI entry point. Gooey (and wx) is only imported here.
+    """
+    from gooey import Gooey, GooeyParser
+
+    @Gooey(**GOOEY_CONFIG)
+    def run():
+        parser = build_parser(GooeyParser(description=DESCRIPTION), gui=True)
+        
+        # Use to create help readme.md. TO BE COMMENT WHEN DONE
+        # if len(sys.argv)==1:
+        #    parser.print_help()
+        #    sys.exit(1)   
+        
+        args = parser.parse_args()
+        process(args)
+
+    run()
+
+def build_parser(parser=None, gui=False):
+    """
+    Add the arguments of the tool to parser (argparse.ArgumentParser if None).
+    The widget and gooey_options are only given to a GooeyParser (gui=True).
+    """
+    if parser is None:
+        parser = argparse.ArgumentParser(prog='mergexlsxspl', description=DESCRIPTION)
+
+    def add_group(name, gooey_options=None):
+        if gui:
+            return parser.add_argument_group(name, gooey_options=gooey_options or {})
+        return parser.add_argument_group(name)
+
+    def add(group, *args, widget=None, gooey_options=None, **kwargs):
+        if gui:
+            kwargs.update(widget=widget, gooey_options=gooey_options or {})
+        group.add_argument(*args, **kwargs)
+
+    main = add_group('Main', gooey_options={'columns': 1})
+    add(main,
         '-i', '--input',
         dest='inputFolder',
         metavar='Input Logs Folder',  
-        help='Input folder to merge all the logs files. (*_FINAL_Log.xlsx)',      
+        help='Input folder to merge all the logs files, also the ones in the zip archives of the folder. (*_FINAL_Log.xlsx)',      
         widget='DirChooser',
         gooey_options={'wildcard': "Logs SPL files (*.xlsx)|*.xlsx"})
     
-    # Use to create help readme.md. TO BE COMMENT WHEN DONE
-    # if len(sys.argv)==1:
-    #    parser.print_help()
-    #    sys.exit(1)   
-        
-    args = parser.parse_args()
-    process(args)
+    batch = add_group('Batch', gooey_options={'columns': 1})
+    add(batch,
+        '-b', '--batch',
+        dest='batch',
+        metavar='Project Folders',
+        nargs='+',
+        default=None,
+        help='Several project folders to merge, one sheets_combined.xlsx in each folder. (used instead of the input folder)',
+        widget='MultiDirChooser')
+    add(batch,
+        '-r', '--recursive',
+        dest='recursive',
+        action='store_true',
+        help='Recursive: merge every folder with logs found under the input (or batch) folders.',
+        widget='CheckBox')
+    
+    options = add_group('Options', gooey_options={'columns': 1})
+    add(options,
+        '-j', '--jobs',
+        dest='jobs',
+        metavar='Parallel Jobs',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Number of processes used to read the logs files in parallel. (1 = no parallel reading)',
+        widget='IntegerField',
+        gooey_options={'min': 1, 'max': 256})
+    add(options,
+        '--reader',
+        dest='engine',
+        metavar='Reader Engine',
+        choices=READER_ENGINES,
+        default='auto',
+        help='Engine used to read the logs: calamine (fast, need python-calamine) or openpyxl; auto uses calamine if installed. (the streaming mode always uses openpyxl)',
+        widget='Dropdown')
+    add(options,
+        '-s', '--streaming',
+        dest='streaming',
+        action='store_true',
+        help='Streaming Merge: constant memory merge for very large campaigns. (rows are streamed one at the time)',
+        widget='CheckBox')
+    add(options,
+        '-c', '--cache',
+        dest='cache',
+        action='store_true',
+        help='Parse Cache: keep a cache of the parsed logs next to the combined spreadsheet; only new or modified logs are read again. (need pyarrow)',
+        widget='CheckBox')
+    add(options,
+        '--cache-size',
+        dest='cacheSize',
+        metavar='Cache Size (MB)',
+        type=int,
+        default=500,
+        help='Maximum size of the parse cache in MB.',
+        widget='IntegerField',
+        gooey_options={'min': 1, 'max': 100000})
+    add(options,
+        '-p', '--profile',
+        dest='profile',
+        action='store_true',
+        help='Profile: print the time and memory of each stage and save a JSON report next to the combined spreadsheet.',
+        widget='CheckBox')
+    add(options,
+        '-d', '--derive',
+        dest='derive',
+        action='store_true',
+        help='Derive Sheets: List_Transposed, *_NotMatching, Duplicated_SPL_Name and SPL_Problem are computed from the merged Full_List instead of read from each log; the duplicated sensor files across the logs are added to Duplicated_Sensor_Data.',
+        widget='CheckBox')
+    
+    shards = add_group('Shards', gooey_options={'columns': 1})
+    add(shards,
+        '--max-rows',
+        dest='maxRows',
+        metavar='Max Rows per Sheet',
+        type=int,
+        default=EXCEL_MAX_ROWS,
+        help='Sheets with more rows are split in numbered shards (Full_List_1, Full_List_2, ...). (Excel limit: %d)' % EXCEL_MAX_ROWS,
+        widget='IntegerField',
+        gooey_options={'min': 1, 'max': EXCEL_MAX_ROWS})
+    add(shards,
+        '--shard-files',
+        dest='shardFiles',
+        action='store_true',
+        help='Shard Files: write each shard in its own workbook next to sheets_combined.xlsx, in parallel. (not in streaming mode)',
+        widget='CheckBox')
+    
+    watch = add_group('Watch', gooey_options={'columns': 1})
+    add(watch,
+        '-w', '--watch',
+        dest='watch',
+        action='store_true',
+        help='Watch: keep sheets_combined.xlsx up to date while new logs are added in the input folder. (Ctrl+C to stop)',
+        widget='CheckBox')
+    add(watch,
+        '--watch-interval',
+        dest='watchInterval',
+        metavar='Watch Interval (s)',
+        type=float,
+        default=5,
+        help='Seconds between two checks of the input folder.',
+        widget='DecimalField',
+        gooey_options={'min': 0.5, 'max': 3600})
+    add(watch,
+        '--watch-debounce',
+        dest='watchDebounce',
+        metavar='Watch Debounce (s)',
+        type=float,
+        default=15,
+        help='Seconds without new or modified logs before the merge is done.',
+        widget='DecimalField',
+        gooey_options={'min': 0, 'max': 3600})
+    
+    export = add_group('Export', gooey_options={'columns': 1})
+    add(export,
+        '-e', '--export',
+        dest='export',
+        metavar='Export Format',
+        choices=EXPORT_FORMATS,
+        default=None,
+        help='Also export each merged sheet as a columnar file in the sheets_combined folder. (parquet and feather need pyarrow)',
+        widget='Dropdown')
+    add(export,
+        '--no-xlsx',
+        dest='noXlsx',
+        action='store_true',
+        help='No XLSX: do not write the formatted sheets_combined.xlsx; only the exported files.',
+        widget='CheckBox')
+    
+    return parser
+
+def get_options(args=None, **kwargs):
+    """
+    Return the options Namespace: the parser defaults, updated with args (a Namespace) and kwargs.
+    """
+    options = vars(build_parser().parse_args([]))
+    if args is not None:
+        options.update(vars(args))
+    for key, value in kwargs.items():
+        if key not in options:
+            raise TypeError(f'process() got an unexpected option {key!r}')
+        options[key] = value
+    return argparse.Namespace(**options)
 
-def process(args):
+def process(args=None, **kwargs):
     """
     Uses this if called as __main__.
+    Can also be used as a library function, e.g. process(inputFolder='D:\\Logs', jobs=4).
     """
+    args = get_options(args, **kwargs)
+    
+    if args.noXlsx and not args.export:
+        print('Nothing to do: no xlsx and no export format selected.', flush=True)
+        return
+    args.engine = reader_engine(args.engine)
+
+    if args.watch:
+        if args.batch or args.recursive:
+            print('The watch mode is only available for one input folder.', flush=True)
+            return
+        watch_folder(args)
+    elif args.batch or args.recursive:
+        merge_batch(args)
+    else:
+        merge_folder(args, open_cache(args))
+
+def reader_engine(engine='auto'):
+    """
+    Return the pandas engine to read the logs: calamine if asked (or auto) and available
+    (python-calamine installed and pandas >= 2.2), else openpyxl.
+    """
+    if engine == 'openpyxl' or (engine == 'auto' and not CALAMINE_AVAILABLE):
+        return 'openpyxl'
+    if not CALAMINE_AVAILABLE:
+        print(f'The calamine reader needs python-calamine and pandas >= 2.2 (pandas {pd.__version__} here), the logs are read with openpyxl.', flush=True)
+        return 'openpyxl'
+    return 'calamine'
+
+def merge_logs(sources, output=None, jobs=1, max_rows=EXCEL_MAX_ROWS, derive=False, engine='auto'):
+    """
+    In-memory merge for the library use (e.g. behind a web upload), nothing is written on disk.
+    sources are paths of logs, folders or zip archives, binary file objects or bytes of *_Log.xlsx
+    (or a list of them).
+    Return the dict {sheet_name: merged DataFrame} if output is None, the bytes of the formatted
+    workbook if output is 'bytes', or write the formatted workbook in output (a binary file object).
+    """
+    if isinstance(sources, (str, bytes, bytearray, os.PathLike)) or hasattr(sources, 'read'):
+        sources = [sources]
+    excel_names = []
+    for i, source in enumerate(sources):
+        if isinstance(source, (bytes, bytearray)):
+            excel_names.append(LogBuffer(bytes(source), f'<log {i}>'))
+        elif hasattr(source, 'read'):
+            excel_names.append(LogBuffer(source.read(), str(getattr(source, 'name', f'<log {i}>'))))
+        elif os.path.isdir(source) or is_archive(source):
+            excel_names.extend(find_logs(source))
+        else:
+            excel_names.append(os.fspath(source))
+    if not excel_names:
+        raise ValueError('No logs to merge.')
+
+    sheet_names = get_sheet_names(excel_names[0])
+    combined = combine_logs(excel_names, sheet_names, derive, jobs=jobs, engine=reader_engine(engine))
+    if output is None:
+        return combined
+    d = {name: combined.get(name, pd.DataFrame()) for name in sheet_names}
+    buffer = io.BytesIO() if output == 'bytes' else output
+    write_combined_excel(d, buffer, max_rows=max_rows)
+    if output == 'bytes':
+        return buffer.getvalue()
+
+def open_cache(args):
+    """
+    Return the ParseCache of the input folder if asked (and pyarrow is available), None otherwise.
+    """
+    if not args.cache:
+        return None
+    if pyarrow is None:
+        print('pyarrow is not installed, the parse cache is not used.', flush=True)
+        return None
+    return ParseCache(os.path.join(output_folder(args.inputFolder), 'sheets_combined_cache'), args.cacheSize * 1024 * 1024)
+
+def merge_folder(args, cache=None, reader=None):
+    """
+    Merge all the logs of args.inputFolder in sheets_combined.xlsx (and/or the export files).
+    """
+    profiler = Profiler(enabled=args.profile).start()
     
     inputFolder = args.inputFolder
-    excel_names = glob.glob(inputFolder + '\\*_Log.xlsx')
+    with profiler.stage('glob') as info:
+        excel_names = find_logs(inputFolder)
+        info['files'] = len(excel_names)
+    outputFolder = output_folder(inputFolder)
+    outputFile = os.path.join(outputFolder, OUTPUT_NAME)
     
     print('', flush=True)
+    if not excel_names:
+        print(f'No {LOG_PATTERN} files found in {inputFolder}', flush=True)
+        return
     print(f'Merging the following files.\n {excel_names}\nPlease wait.......', flush=True)
+    os.makedirs(outputFolder, exist_ok=True)
 
-    xl = pd.read_excel(excel_names[0], sheet_name=None, engine='openpyxl')
-    d = {name: combine_excel_to_dfs(excel_names, name) for name in xl.keys()}
-    d['Summary_Process_Log'] = pd.DataFrame()
-    
-    # Create a Pandas Excel writer using XlsxWriter as the engine.
-    if os.path.exists(inputFolder + '\\sheets_combined.xlsx'):
-        os.remove(inputFolder + '\\sheets_combined.xlsx')
+    # Sheet names come from the workbook metadata only, no cell data is loaded.
+    # The Summary_Process_Log of each log is replaced by the merged summary, no need to read it.
+    with profiler.stage('sheet_names'):
+        sheet_names = get_sheet_names(excel_names[0])
+
+    if args.streaming:
+        if args.export:
+            print('The export is not available in streaming mode.', flush=True)
+        if args.derive:
+            print('The derived sheets are not available in streaming mode, all the sheets are merged from the logs.', flush=True)
+        if args.shardFiles:
+            print('The shard files are not available in streaming mode, the shards are written in sheets_combined.xlsx.', flush=True)
+        if not args.noXlsx:
+            with atomic_output(outputFile) as tmpFile:
+                stream_excel_files(excel_names, sheet_names, tmpFile, profiler=profiler, max_rows=args.maxRows,
+                                   shard_prefix=os.path.splitext(outputFile)[0])
+    else:
+        combined = combine_logs(excel_names, sheet_names, args.derive, jobs=args.jobs, cache=cache,
+                                profiler=profiler, reader=reader, engine=args.engine)
+        d = {name: combined.get(name, pd.DataFrame()) for name in sheet_names}
+        if args.export:
+            with profiler.stage('export', format=args.export):
+                export_frames(d, os.path.join(outputFolder, 'sheets_combined'), args.export)
+        if not args.noXlsx:
+            with atomic_output(outputFile) as tmpFile:
+                write_combined_excel(d, tmpFile, profiler=profiler, max_rows=args.maxRows, jobs=args.jobs,
+                                     shard_prefix=os.path.splitext(outputFile)[0], write_shard_files=args.shardFiles)
+
+    if args.profile:
+        profiler.stop()
+        profiler.summary()
+        reportFile = os.path.join(outputFolder, 'sheets_combined_profile.json')
+        profiler.report(reportFile, input=inputFolder, files=len(excel_names), options=vars(args))
+        print(f'Profile report saved in {reportFile}', flush=True)
+
+def find_logs(folder):
+    """
+    Return the sorted list of the *_Log.xlsx of a folder, followed by the logs of its zip archives
+    (ZipLog). The folder can also be a zip archive.
+    """
+    if is_archive(folder):
+        return zip_logs(folder)
+    logs = sorted(glob.glob(os.path.join(glob.escape(folder), LOG_PATTERN)))
+    for archive in sorted(glob.glob(os.path.join(glob.escape(folder), ARCHIVE_PATTERN))):
+        logs.extend(zip_logs(archive))
+    return logs
+
+def is_archive(path):
+    return fnmatch.fnmatch(os.path.basename(path).lower(), ARCHIVE_PATTERN) and os.path.isfile(path)
+
+def zip_logs(archive):
+    """
+    Return the ZipLog of each *_Log.xlsx in a zip archive (in any folder of the archive), sorted by name.
+    Only the central directory of the archive is read.
+    """
+    try:
+        with zipfile.ZipFile(archive) as z:
+            infos = [info for info in z.infolist()
+                     if not info.is_dir() and fnmatch.fnmatch(posixpath.basename(info.filename), LOG_PATTERN)]
+    except (zipfile.BadZipFile, OSError) as e: # e.g. an archive still being copied
+        print(f'{archive} skipped: {e}', flush=True)
+        return []
+    return [ZipLog(archive, info.filename, info.file_size, info.CRC) for info in sorted(infos, key=lambda info: info.filename)]
 
-    writer = pd.ExcelWriter(inputFolder + '\\sheets_combined.xlsx', engine='xlsxwriter')
+def output_folder(inputFolder):
+    """
+    Return the folder of the outputs: the input folder, or for a zip archive the folder named
+    as the archive next to it.
+    """
+    if is_archive(inputFolder):
+        return os.path.splitext(inputFolder)[0]
+    return inputFolder
+
+def find_project_folders(roots, recursive=False):
+    """
+    Return the project folders: the roots themselves, or with recursive all the folders
+    under the roots that have *_Log.xlsx files or zip archives of logs (the cache and export
+    folders are skipped).
+    """
+    if not recursive:
+        return list(roots)
+    folders = []
+    for root in roots:
+        if is_archive(root):
+            folders.append(root)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if d not in ['sheets_combined', 'sheets_combined_cache'])
+            if any(fnmatch.fnmatch(name, LOG_PATTERN) for name in filenames) or \
+               any(is_archive(os.path.join(dirpath, name)) and zip_logs(os.path.join(dirpath, name)) for name in filenames):
+                folders.append(dirpath)
+    return folders
+
+def merge_batch(args):
+    """
+    Batch mode: one sheets_combined.xlsx for each project folder. All the projects share the same
+    process pool; the logs of the next projects are read while the current project is written.
+    """
+    roots = args.batch or [args.inputFolder]
+    folders = find_project_folders(roots, args.recursive)
+    print(f'{len(folders)} project folders to merge.', flush=True)
+
+    projects = []
+    for folder in folders:
+        project_args = argparse.Namespace(**dict(vars(args), inputFolder=folder))
+        projects.append((project_args, open_cache(project_args)))
+
+    failed = []
+    jobs = args.jobs or 1
+    with contextlib.ExitStack() as stack:
+        reader = None
+        if jobs > 1 and not args.streaming:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=jobs))
+            reader = PoolReader(executor, window=2 * jobs, profile=args.profile, engine=args.engine)
+            for project_args, cache in projects:
+                try:
+                    excel_names = find_logs(project_args.inputFolder)
+                    if excel_names:
+                        sheet_names = sheets_to_read(get_sheet_names(excel_names[0]), args.derive)
+                        if cache is not None:
+                            excel_names = [x for x in excel_names if not cache.has(cache.key(x), sheet_names)]
+                        reader.schedule(excel_names, sheet_names)
+                except Exception as e: # e.g. an unreadable log, the project is not merged
+                    print(f'Merge of {project_args.inputFolder} failed: {e!r}', flush=True)
+                    failed.append(project_args.inputFolder)
+        for project_args, cache in projects:
+            if project_args.inputFolder in failed:
+                continue
+            try:
+                merge_folder(project_args, cache, reader=reader)
+            except Exception as e: # keep going with the other projects
+                print(f'Merge of {project_args.inputFolder} failed: {e!r}', flush=True)
+                failed.append(project_args.inputFolder)
+                if reader is not None:
+                    reader.discard(find_logs(project_args.inputFolder))
+
+    print('', flush=True)
+    print(f'{len(folders) - len(failed)} of {len(folders)} project folders merged.', flush=True)
+    for folder in failed:
+        print(f'Failed: {folder}', flush=True)
+
+@contextlib.contextmanager
+def atomic_output(outputFile):
+    """
+    Yield a temporary file name next to outputFile, renamed to outputFile once fully written.
+    The output is never seen half written and the previous one is kept if the writing fails.
+    """
+    root, ext = os.path.splitext(outputFile)
+    tmpFile = f'{root}.tmp{os.getpid()}{ext}'
+    try:
+        yield tmpFile
+        os.replace(tmpFile, outputFile)
+    finally:
+        if os.path.exists(tmpFile):
+            os.remove(tmpFile)
+
+def watch_folder(args):
+    """
+    Watch mode: keep sheets_combined.xlsx up to date while new logs are added in the input folder.
+    The folder is polled every args.watchInterval seconds; the merge is done when no log was added
+    or modified during args.watchDebounce seconds. Only the new or modified logs are read again.
+    """
+    cache = open_cache(args) or MemoryCache()
+    print(f'Watching {args.inputFolder} for new logs. (Ctrl+C to stop)', flush=True)
+
+    merged = None   # logs state of the last merge
+    last = None     # logs state of the last poll
+    changed_at = 0
+    try:
+        while True:
+            state = {}
+            for excel_name in find_logs(args.inputFolder):
+                try:
+                    st = os.stat(log_path(excel_name))
+                except OSError: # removed since the glob
+                    continue
+                state[excel_name] = (st.st_size, st.st_mtime_ns)
+            if state != last:
+                last = state
+                changed_at = time.time()
+            elif state and state != merged and time.time() - changed_at >= args.watchDebounce:
+                try:
+                    merge_folder(args, cache)
+                    merged = state
+                    print(f'{datetime.datetime.now():%Y-%m-%d %H:%M:%S} {OUTPUT_NAME} updated with {len(state)} logs.', flush=True)
+                except Exception as e: # e.g. a log still being copied, or the output opened in Excel
+                    print(f'Merge failed, will retry on the next change: {e!r}', flush=True)
+                    merged = state
+            time.sleep(args.watchInterval)
+    except KeyboardInterrupt:
+        print('Watch stopped.', flush=True)
+
+def export_frames(d, exportFolder, fmt):
+    """
+    Export each merged sheet as a columnar file (parquet, feather or csv) named <sheet_name>.<fmt>.
+    """
+    if fmt in ['parquet', 'feather'] and pyarrow is None:
+        print(f'pyarrow is not installed, the {fmt} export is not available.', flush=True)
+        return
+    os.makedirs(exportFolder, exist_ok=True)
+    for name, df in d.items():
+        if name == 'Summary_Process_Log':
+            continue
+        df = prepare_export_frame(df, typed=(fmt != 'csv'))
+        exportFile = os.path.join(exportFolder, f'{name}.{fmt}')
+        if fmt == 'parquet':
+            df.to_parquet(exportFile, index=False)
+        elif fmt == 'feather':
+            df.to_feather(exportFile)
+        else:
+            df.to_csv(exportFile, index=False, date_format='%Y-%m-%d %H:%M:%S')
+
+def prepare_export_frame(df, typed=True):
+    """
+    Return a copy of a merged sheet ready for the export: default index, datetime dtype for the
+    DATETIME_COLUMNS and, for the typed formats, the mixed object columns (and categories)
+    converted to text.
+    """
+    df = df.reset_index(drop=True)
+    for col in df.columns:
+        if col in DATETIME_COLUMNS:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+        elif typed and isinstance(df[col].dtype, pd.CategoricalDtype) and df[col].cat.categories.dtype == object:
+            values = df[col].astype(object)
+            df[col] = values.where(values.isna(), values.astype(str)).astype('category')
+        elif typed and df[col].dtype == object:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def shard_names(name, nrows, max_rows=EXCEL_MAX_ROWS):
+    """
+    Return the worksheet names of a sheet: [name] if it fits in max_rows, else name_1, name_2, ...
+    """
+    if nrows <= max_rows:
+        return [name]
+    return [f'{name}_{i}' for i in range(1, math.ceil(nrows / max_rows) + 1)]
+
+def shard_links(shards, shard_files):
+    """
+    Return the Summary_Process_Log link of each worksheet: internal, or external for the shard files.
+    """
+    links = {}
+    for name, names in shards.items():
+        for shard in names:
+            if shard in shard_files:
+                links[shard] = 'external:' + os.path.basename(shard_files[shard])
+            else:
+                links[shard] = f'internal:{shard}!A1'
+    return links
+
+def write_combined_excel(d, outputFile, profiler=None, max_rows=EXCEL_MAX_ROWS, jobs=1, shard_prefix=None,
+                         write_shard_files=False):
+    """
+    Write the dict of merged DataFrames to a formatted workbook.
+    The sheets with more than max_rows rows are split in shards; with write_shard_files the shards
+    are written in their own workbooks <shard_prefix>_<shard>.xlsx (in parallel with jobs > 1).
+    shard_prefix is the workbook path without extension (None for a file object output), the
+    shard files of a previous merge not written again are removed.
+    """
+    profiler = profiler or NO_PROFILER
+    shards = {name: shard_names(name, df.shape[0], max_rows) for name, df in d.items()}
+    # (worksheet, sheet, rows) of each shard
+    parts = [(shard, name, d[name].iloc[i * max_rows:(i + 1) * max_rows])
+             for name in d for i, shard in enumerate(shards[name])]
+    def cond_layout(name, df):
+        # The *_NotMatching sheets are highlighted with the List_Transposed layout (first shard)
+        if name in TRANSPOSED_SHEETS and name != 'List_Transposed' and 'List_Transposed' in d:
+            return d['List_Transposed'].columns, min(d['List_Transposed'].shape[0], max_rows)
+        return df.columns, df.shape[0]
+
+    shard_files = {}
+    if shard_prefix and write_shard_files:
+        shard_files = {shard: f'{shard_prefix}_{shard}.xlsx' for shard, name, df in parts if len(shards[name]) > 1}
+    if shard_prefix:
+        for name in d:
+            remove_stale_shard_files(shard_prefix, name, sum(shard in shard_files for shard in shards[name]) + 1)
+    links = shard_links(shards, shard_files)
+
+    # Create a Pandas Excel writer using XlsxWriter as the engine.
+    # A file object output (merge_logs) is written without the xlsxwriter temp files.
+    options = {} if isinstance(outputFile, (str, os.PathLike)) else {'options': {'in_memory': True}}
+    writer = pd.ExcelWriter(outputFile, engine='xlsxwriter', engine_kwargs=options)
 
     # Write each dataframe to a different worksheet.
+    for shard, name, df in parts:
+        if shard not in shard_files:
+            with profiler.stage('to_excel', sheet=shard, rows=df.shape[0], columns=df.shape[1]):
+                df.to_excel(writer, sheet_name=shard)
 
     workbook  = writer.book
+    w = {shard: writer.sheets[shard] for shard, name, df in parts if shard not in shard_files}
 
-    for name, df in d.items():
-        df.to_excel(writer, sheet_name=name)
+    with profiler.stage('format'):
+        f = add_formats(workbook)
+        write_summary_sheet(w['Summary_Process_Log'], f, shards, links)
+        for shard, name, df in parts:
+            if shard in w and name != 'Summary_Process_Log':
+                write_header(w[shard], df.columns, f)
+                format_sheet(w[shard], name, df.columns, df.shape[0], f)
+    with profiler.stage('conditional_format'):
+        for shard, name, df in parts:
+            if shard in w:
+                add_conditional_formats(w[shard], name, *cond_layout(name, df), f)
+
+    if shard_files:
+        summary_url = f'external:{os.path.basename(shard_prefix)}.xlsx#Summary_Process_Log!A1'
+        tasks = [(df, shard, name, shard_files[shard], cond_layout(name, df), summary_url)
+                 for shard, name, df in parts if shard in shard_files]
+        with profiler.stage('shard_files', files=len(tasks)):
+            if jobs > 1:
+                with ProcessPoolExecutor(min(jobs, len(tasks))) as executor:
+                    list(executor.map(write_shard_workbook, *zip(*tasks)))
+            else:
+                for task in tasks:
+                    write_shard_workbook(*task)
+
+    # Close the Pandas Excel writer and output the Excel file.
+    with profiler.stage('save'):
+        writer.close()
+
+def write_shard_workbook(df, shard, name, shardFile, cond_layout, summary_url):
+    """
+    Write one shard of a sheet in its own formatted workbook (run in a worker process).
+    """
+    with atomic_output(shardFile) as tmpFile:
+        writer = pd.ExcelWriter(tmpFile, engine='xlsxwriter')
+        df.to_excel(writer, sheet_name=shard)
+        ws = writer.sheets[shard]
+        f = add_formats(writer.book)
+        write_header(ws, df.columns, f, summary_url)
+        format_sheet(ws, name, df.columns, df.shape[0], f)
+        add_conditional_formats(ws, name, *cond_layout, f)
+        writer.close()
+
+def remove_stale_shard_files(shard_prefix, name, first):
+    """
+    Remove the shard files <shard_prefix>_<name>_<n>.xlsx left by a previous merge, from n = first.
+    """
+    n = first
+    while os.path.exists(f'{shard_prefix}_{name}_{n}.xlsx'):
+        os.remove(f'{shard_prefix}_{name}_{n}.xlsx')
+        n += 1
+
+def stream_excel_files(excel_names, sheet_names, outputFile, profiler=None, max_rows=EXCEL_MAX_ROWS, shard_prefix=None):
+    """
+    Constant memory merge: the rows are read with the openpyxl read-only iterator and written
+    straight to xlsxwriter in constant_memory mode. Only one row is kept in memory at the time.
+    The columns layout of each sheet is taken from the first file (same layout in all the logs).
+    The shards of the sheets bigger than max_rows are known before the merge from the rows count
+    of each log (worksheet dimension), the worksheets have to be created in order.
+    The shard files <shard_prefix>_<shard>.xlsx of a previous merge are removed.
+    """
+    profiler = profiler or NO_PROFILER
+    if shard_prefix:
+        for name in sheet_names:
+            remove_stale_shard_files(shard_prefix, name, 1)
+    with profiler.stage('count_rows'):
+        total = collections.Counter()
+        for excel_name in excel_names:
+            # Without the header row of each log
+            total.update({name: max(rows - 1, 0) for name, rows in count_sheet_rows(excel_name).items()})
+    shards = {name: shard_names(name, total[name], max_rows) if name != 'Summary_Process_Log' else [name]
+              for name in sheet_names}
+
+    workbook = xlsxwriter.Workbook(outputFile, {'constant_memory': True})
+    f = add_formats(workbook)
+    # Same cell format than pandas to_excel for the datetime values; the index and the other
+    # values have no cell format, they take the columns format (set before the rows)
+    date_format = workbook.add_format({'num_format': 'YYYY-MM-DD HH:MM:SS'})
+
+    w = {shard: workbook.add_worksheet(shard) for name in sheet_names for shard in shards[name]}
+    columns = {}
+    nrows = {name: 0 for name in sheet_names}
+    shard_rows = {shard: 0 for shard in w}
+    formatted = {}  # shards with the columns formats set
 
-    w = {name: writer.sheets[name] for name in xl.keys()}
-    w['Summary_Process_Log'].hide_gridlines(2) 
+    write_summary_sheet(w['Summary_Process_Log'], f, shards, shard_links(shards, {}))
+    for excel_name in excel_names:
+        with profiler.stage('stream_file', file=excel_name):
+            wb = openpyxl.load_workbook(open_log(excel_name), read_only=True, data_only=True)
+            try:
+                for name in sheet_names:
+                    if name == 'Summary_Process_Log' or name not in wb.sheetnames:
+                        continue
+                    rows = wb[name].iter_rows(values_only=True)
+                    header = next(rows, None)
+                    if header is None:
+                        continue
+                    if name not in columns:
+                        columns[name] = pd.Index(header[1:])
+                        for shard in shards[name]:
+                            write_header(w[shard], columns[name], f)
+                            formatted[shard] = format_columns(w[shard], name, columns[name], f)
+                    index = 0
+                    for row in rows:
+                        if all(value is None for value in row):
+                            continue
+                        # The last shard takes the extra rows if the dimension was too small
+                        shard = shards[name][min(nrows[name] // max_rows, len(shards[name]) - 1)]
+                        ws = w[shard]
+                        nrows[name] += 1
+                        shard_rows[shard] += 1
+                        r = shard_rows[shard]
+                        ws.write_number(r, 0, index)
+                        for col_num, value in enumerate(row[1:], 1):
+                            if value is None:
+                                continue
+                            elif isinstance(value, datetime.datetime):
+                                ws.write_datetime(r, col_num, value, date_format)
+                            else:
+                                ws.write(r, col_num, value)
+                        index += 1
+            finally:
+                wb.close()
 
+    layouts = {shard: (columns.get(name, pd.Index([])), shard_rows[shard]) for name in sheet_names for shard in shards[name]}
+    with profiler.stage('format'):
+        for name in sheet_names:
+            for shard in shards[name]:
+                if name != 'Summary_Process_Log':
+                    if name not in columns:
+                        write_header(w[shard], layouts[shard][0], f)
+                        format_sheet(w[shard], name, *layouts[shard], f)
+                    elif formatted[shard]:
+                        w[shard].autofilter(0, 0, layouts[shard][1], len(layouts[shard][0]))
+    with profiler.stage('conditional_format'):
+        for name in sheet_names:
+            for shard in shards[name]:
+                # The *_NotMatching sheets are highlighted with the List_Transposed layout (first shard)
+                if name in TRANSPOSED_SHEETS and name != 'List_Transposed' and 'List_Transposed' in shards:
+                    layout = layouts[shards['List_Transposed'][0]]
+                else:
+                    layout = layouts[shard]
+                add_conditional_formats(w[shard], name, *layout, f)
+
+    with profiler.stage('save'):
+        workbook.close()
+
+def add_formats(workbook):
+    """
+    Create all the cell formats used in the combined workbook.
+    """
+    f = {}
     #### Set format       
-    bold = workbook.add_format({'bold': True,
+    f['bold'] = workbook.add_format({'bold': True,
                                 'font_name': 'Segoe UI',
                                 'font_size': 10,
                                 'valign': 'vcenter',})
-    normal = workbook.add_format({'bold': False,
+    f['normal'] = workbook.add_format({'bold': False,
                                 'font_name': 'Segoe UI',
                                 'font_size': 10,
                                 'valign': 'vcenter',})
-    hlink = workbook.add_format({'bold': False,
+    f['hlink'] = workbook.add_format({'bold': False,
                                 'font_color': '#0250AE',
                                 'underline': True,
                                 'font_name': 'Segoe UI',
                                 'font_size': 10,
                                 'valign': 'vcenter',})
 
-    session_format = workbook.add_format({'num_format': '0',
+    f['session'] = workbook.add_format({'num_format': '0',
                                           'text_wrap': True,
                                           'font_name': 'Segoe UI',
                                           'font_size': 10,
@@ -145,7 +955,7 @@ def process(args):
                                           'border_color': '#000000',
                                           'border': 1})
     
-    cell_format = workbook.add_format({'text_wrap': True,
+    f['cell'] = workbook.add_format({'text_wrap': True,
                                     'font_name': 'Segoe UI',
                                     'font_size': 10,
                                     'valign': 'vcenter',
@@ -153,7 +963,7 @@ def process(args):
                                     'border_color': '#000000',
                                     'border': 1})
 
-    header_format = workbook.add_format({'bold': True,
+    f['header'] = workbook.add_format({'bold': True,
                                         'font_name': 'Segoe UI',
                                         'font_size': 12,
                                         'text_wrap': False,
@@ -164,189 +974,824 @@ def process(args):
                                         'border_color': '#FFFFFF',
                                         'border': 1})
 
-    textFull = [bold, 'Full_List', normal, ': Full log list of all sensors without duplicated and skip files. (Sensors Not Transposed)']
-    textTrans = [bold, 'List_Transposed', normal, ': Log list of all sensors transposed and matching all sessions)']
-    textRename = [bold, 'Rename_LN', normal, ': Rename Sheet to be use if you just want to use the LineName option in the rename tool.)']
-    textMissingSPL = [bold, 'Missing_SPL', normal, ': List of all sensors that have missing SPL file.']
-    textMBES = [bold, 'MBES_NotMatching', normal, ': MBES log list of all files that do not match the SPL name; without duplicated and skip files']
-    textSSS = [bold, 'SSS_NotMatching', normal, ': SSS log list of all files that do not match the SPL name; without duplicated and skip files']
-    textSBP = [bold, 'SBP_NotMatching', normal, ': SBP log list of all files that do not match the SPL name; without duplicated and skip files']
-    textMAG = [bold, 'MAG_NotMatching', normal, ': MAG log list of all files that do not match the SPL name; without duplicated and skip files']
-    textSUHRS = [bold, 'SUHRS_NotMatching', normal, ': SUHRS log list of all files that do not match the SPL name; without duplicated and skip files']
-    textDuplSPL = [bold, 'Duplicated_SPL_Name', normal, ': List of all duplicated SPL name']
-    textDuplSensor = [bold, 'Duplicated_Sensor_Data', normal, ': List of all duplicated sensors files; Based on the start time']
-    textSPLProblem = [bold, 'SPL_Problem', normal, ': List of all SPL session without a line name in the columns LineName, are empty or too small']
-    textSkip = [bold, 'Skip_SSS_Files', normal, ': List of all SSS data that have a file size less than 1 MB']
-    textsgy = [bold, 'Wrong_SBP_Time', normal, ': List of all SBP data that have a wrong timestamp']
-
-    ListT = [textFull, textTrans, textRename, textMissingSPL, textMBES, textSSS, textSBP, textMAG, textSUHRS, textDuplSPL, textDuplSensor, 
-             textSPLProblem, textSkip, textsgy]
-    ListHL = ['internal:Full_List!A1', 'internal:List_Transposed!A1', 'internal:Rename_LN!A1', 'internal:Missing_SPL!A1', 
-              'internal:MBES_NotMatching!A1', 'internal:SSS_NotMatching!A1', 'internal:SBP_NotMatching!A1', 'internal:MAG_NotMatching!A1',
-              'internal:SUHRS_NotMatching!A1','internal:Duplicated_SPL_Name!A1', 'internal:Duplicated_Sensor_Data!A1', 
-              'internal:SPL_Problem!A1', 'internal:Skip_SSS_Files!A1', 'internal:Wrong_SBP_Time!A1']
-                
-    icount = 1
-    for e, l in zip(ListT,ListHL):
-        w['Summary_Process_Log'].write_rich_string(icount, 1, *e)
-        w['Summary_Process_Log'].write_url(icount, 0, l, hlink, string='Link')
-        icount += 1
-
-    # Others Sheet
-    for name, ws in w.items():
-        if name != 'Summary_Process_Log':
-            ws.write_url(0, 0, 'internal:Summary_Process_Log!A1', hlink, string='Summary')
-
-    for (namedf, df), (namews, ws) in zip(d.items(), w.items()):
-        if namews != 'Summary_Process_Log':
-            list1 = ['List_Transposed', 'MBES_NotMatching', 'SSS_NotMatching', 'SBP_NotMatching', 'MAG_NotMatching', 'SUHRS_NotMatching']
-            list2 = ['Skip_SSS_Files', 'Duplicated_Sensor_Data', 'Wrong_SBP_Time']
-            for col_num, value in enumerate(df.columns.values):
-                ws.set_row(0, 25)
-                ws.write(0, col_num + 1, value, header_format)                
-            if namews == 'Full_List':                
-                ws.autofilter(0, 0, df.shape[0], df.shape[1])
-                ws.set_column(0, 0, 11, cell_format) # ID
-                ws.set_column(df.columns.get_loc('Sensor Start')+1, df.columns.get_loc('Session End')+1, 24, cell_format) # DateTime
-                ws.set_column(df.columns.get_loc('Session Name')+1, df.columns.get_loc('Session Name')+1, 20, session_format) # Session Name
-                ws.set_column(df.columns.get_loc('Session MaxGap')+1, df.columns.get_loc('Sensor Type')+1, 20, cell_format) # Session Info
-                ws.set_column(df.columns.get_loc('FilePath')+1, df.columns.get_loc('FilePath')+1, 150, cell_format)
-                ws.set_column(df.columns.get_loc('Sensor FileName')+1, df.columns.get_loc('Sensor FileName')+1, 50, cell_format)
-                ws.set_column(df.columns.get_loc('SPL LineName')+1, df.columns.get_loc('SPL LineName')+1, 20, cell_format)
-                ws.set_column(df.columns.get_loc('SPL LineName')+2, df.shape[1], 150, cell_format) # SPL Name
-            elif namews == 'Missing_SPL':
-                ws.autofilter(0, 0, df.shape[0], df.shape[1])
-                ws.set_column(0, 0, 11, cell_format) # ID
-                ws.set_column(df.columns.get_loc('Sensor Start')+1, df.columns.get_loc('Sensor Start')+1, 24, cell_format)
-                ws.set_column(df.columns.get_loc('Sensor FileName')+1, df.columns.get_loc('Sensor FileName')+1, 50, cell_format)
-                ws.set_column(df.columns.get_loc('Sensor Type')+1, df.columns.get_loc('Vessel Name')+1, 24, session_format)
-                ws.set_column(df.columns.get_loc('FilePath')+1, df.columns.get_loc('FilePath')+1, 150, cell_format) 
-            elif namews == 'Rename_LN':
-                ws.autofilter(0, 0, df.shape[0], df.shape[1])
-                ws.set_column(0, 0, 11, cell_format) # ID
-                ws.set_column(df.columns.get_loc('Sensor Start')+1, df.columns.get_loc('Sensor Start')+1, 24, cell_format)
-                ws.set_column(df.columns.get_loc('Sensor FileName')+1, df.columns.get_loc('New LineName')+1, 50, cell_format)
-                ws.set_column(df.columns.get_loc('SPL LineName')+1, df.columns.get_loc('SPL LineName')+1, 20, cell_format)
-                ws.set_column(df.columns.get_loc('Sensor Type')+1, df.columns.get_loc('Vessel Name')+1, 24, session_format)
-                ws.set_column(df.columns.get_loc('FilePath')+1, df.columns.get_loc('FilePath')+1, 150, cell_format)            
-            elif namews in list2:                
-                ws.autofilter(0, 0, df.shape[0], df.shape[1])
-                ws.set_column(0, 0, 11, cell_format) # ID
-                ws.set_column(1, df.shape[1], 50, cell_format) 
-                #ws.set_column(3, df.shape[1], 150, cell_format) # Path
-            elif namews in list1:
-                ws.autofilter(0, 0, df.shape[0], df.shape[1])
-                ws.set_column(0, 0, 11, cell_format) # ID
-                ws.set_column(df.columns.get_loc('Session Start')+1, df.columns.get_loc('Session End')+1, 22, cell_format) # DateTime
-                ws.set_column(df.columns.get_loc('Session Name')+1, df.columns.get_loc('Session Name')+1, 20, session_format) # Session Name
-                ws.set_column(df.columns.get_loc('Session MaxGap')+1, df.columns.get_loc('SPL')+1, 20, cell_format) # Session Info
-                ws.set_column(df.columns.get_loc('SPL')+2, df.shape[1], 50, cell_format) # Sensors   
-                
-    #    for i, width in enumerate(get_col_widths(df)): # Autosize will not work because of the "\n" in the text
-    #        ws.set_column(i, i, width, cell_format)
-
-    # Add a format.
-    fWRONG = workbook.add_format({'bg_color': '#FFC7CE',
+    # Conditional formats
+    f['WRONG'] = workbook.add_format({'bg_color': '#FFC7CE',
                                 'font_color': '#9C0006'})
-    fOK = workbook.add_format({'bg_color': '#C6EFCE',
+    f['OK'] = workbook.add_format({'bg_color': '#C6EFCE',
                                 'font_color': '#006100'})
-    fBLANK = workbook.add_format({'bg_color': '#FFFFFF',
+    f['BLANK'] = workbook.add_format({'bg_color': '#FFFFFF',
                                 'font_color': '#000000'})
-    fDUPL = workbook.add_format({'bg_color': '#2385FC',
+    f['DUPL'] = workbook.add_format({'bg_color': '#2385FC',
                                 'font_color': '#FFFFFF'})
-    fWSPL = workbook.add_format({'bg_color': '#C90119',
+    f['WSPL'] = workbook.add_format({'bg_color': '#C90119',
                                 'font_color': '#FFFFFF'})
+    return f
+
+def write_summary_sheet(ws, f, shards=None, links=None):
+    """
+    Write the Summary_Process_Log table with the description and link of each sheet.
+    shards is a dict {sheet_name: [worksheet names]} and links {worksheet name: url} for the
+    sharded sheets, one row for each shard.
+    """
+    bold, normal = f['bold'], f['normal']
+    ws.hide_gridlines(2) 
+    shards = shards or {}
+    links = links or {}
+
+    icount = 1
+    for name, text in SHEET_DESCRIPTIONS.items():
+        names = shards.get(name, [name])
+        for i, shard in enumerate(names, 1):
+            part = f' (part {i}/{len(names)})' if len(names) > 1 else ''
+            ws.write_rich_string(icount, 1, bold, shard, normal, text + part)
+            ws.write_url(icount, 0, links.get(shard, f'internal:{shard}!A1'), f['hlink'], string='Link')
+            icount += 1
+
+def write_header(ws, columns, f, summary_url='internal:Summary_Process_Log!A1'):
+    """
+    Write the link to the summary and the header row of a sheet.
+    The header row have to be written before any data row in constant_memory mode.
+    """
+    ws.set_row(0, 25)
+    ws.write_url(0, 0, summary_url, f['hlink'], string='Summary')
+    for col_num, value in enumerate(columns.values):
+        ws.write(0, col_num + 1, value, f['header'])                
+
+def format_sheet(ws, name, columns, nrows, f):
+    """
+    Set the autofilter and the columns width/format of a sheet.
+    """
+    if format_columns(ws, name, columns, f):
+        ws.autofilter(0, 0, nrows, len(columns))
+
+def format_columns(ws, name, columns, f):
+    """
+    Set the columns width/format of a sheet; return False if the sheet is not formatted.
+    In constant_memory mode they have to be set before the data rows to apply to their cells.
+    """
+    cell_format, session_format = f['cell'], f['session']
+    ncols = len(columns)
+    list1 = ['List_Transposed', 'MBES_NotMatching', 'SSS_NotMatching', 'SBP_NotMatching', 'MAG_NotMatching', 'SUHRS_NotMatching']
+    list2 = ['Skip_SSS_Files', 'Duplicated_Sensor_Data', 'Wrong_SBP_Time']
+    if name == 'Full_List':                
+        ws.set_column(0, 0, 11, cell_format) # ID
+        ws.set_column(columns.get_loc('Sensor Start')+1, columns.get_loc('Session End')+1, 24, cell_format) # DateTime
+        ws.set_column(columns.get_loc('Session Name')+1, columns.get_loc('Session Name')+1, 20, session_format) # Session Name
+        ws.set_column(columns.get_loc('Session MaxGap')+1, columns.get_loc('Sensor Type')+1, 20, cell_format) # Session Info
+        ws.set_column(columns.get_loc('FilePath')+1, columns.get_loc('FilePath')+1, 150, cell_format)
+        ws.set_column(columns.get_loc('Sensor FileName')+1, columns.get_loc('Sensor FileName')+1, 50, cell_format)
+        ws.set_column(columns.get_loc('SPL LineName')+1, columns.get_loc('SPL LineName')+1, 20, cell_format)
+        ws.set_column(columns.get_loc('SPL LineName')+2, ncols, 150, cell_format) # SPL Name
+    elif name == 'Missing_SPL':
+        ws.set_column(0, 0, 11, cell_format) # ID
+        ws.set_column(columns.get_loc('Sensor Start')+1, columns.get_loc('Sensor Start')+1, 24, cell_format)
+        ws.set_column(columns.get_loc('Sensor FileName')+1, columns.get_loc('Sensor FileName')+1, 50, cell_format)
+        ws.set_column(columns.get_loc('Sensor Type')+1, columns.get_loc('Vessel Name')+1, 24, session_format)
+        ws.set_column(columns.get_loc('FilePath')+1, columns.get_loc('FilePath')+1, 150, cell_format) 
+    elif name == 'Rename_LN':
+        ws.set_column(0, 0, 11, cell_format) # ID
+        ws.set_column(columns.get_loc('Sensor Start')+1, columns.get_loc('Sensor Start')+1, 24, cell_format)
+        ws.set_column(columns.get_loc('Sensor FileName')+1, columns.get_loc('New LineName')+1, 50, cell_format)
+        ws.set_column(columns.get_loc('SPL LineName')+1, columns.get_loc('SPL LineName')+1, 20, cell_format)
+        ws.set_column(columns.get_loc('Sensor Type')+1, columns.get_loc('Vessel Name')+1, 24, session_format)
+        ws.set_column(columns.get_loc('FilePath')+1, columns.get_loc('FilePath')+1, 150, cell_format)            
+    elif name in list2:                
+        ws.set_column(0, 0, 11, cell_format) # ID
+        ws.set_column(1, ncols, 50, cell_format) 
+        #ws.set_column(3, ncols, 150, cell_format) # Path
+    elif name in list1:
+        ws.set_column(0, 0, 11, cell_format) # ID
+        ws.set_column(columns.get_loc('Session Start')+1, columns.get_loc('Session End')+1, 22, cell_format) # DateTime
+        ws.set_column(columns.get_loc('Session Name')+1, columns.get_loc('Session Name')+1, 20, session_format) # Session Name
+        ws.set_column(columns.get_loc('Session MaxGap')+1, columns.get_loc('SPL')+1, 20, cell_format) # Session Info
+        ws.set_column(columns.get_loc('SPL')+2, ncols, 50, cell_format) # Sensors   
+    else:
+        return False
+    #    for i, width in enumerate(get_col_widths(df)): # Autosize will not work because of the "\n" in the text
+    #        ws.set_column(i, i, width, cell_format)
+    return True
+
+def add_conditional_formats(ws, name, columns, nrows, f):
+    """
+    Highlight the values of a Full_List, List_Transposed or *_NotMatching worksheet (or shard).
+    columns and nrows are the layout of the highlighted ranges.
+    """
+    fWRONG, fOK, fBLANK, fDUPL, fWSPL = f['WRONG'], f['OK'], f['BLANK'], f['DUPL'], f['WSPL']
 
     # Highlight the values (first is overwrite the others below.....)
-    FMaxGap_start = xl_rowcol_to_cell(1, d['Full_List'].columns.get_loc('Session MaxGap')+1, row_abs=True, col_abs=True)
-    FMaxGap_end = xl_rowcol_to_cell(d['Full_List'].shape[0]+1, d['Full_List'].columns.get_loc('Session MaxGap')+1, row_abs=True, col_abs=True)
-    w['Full_List'].conditional_format('%s:%s' % (FMaxGap_start, FMaxGap_end), {'type':     'cell',
-                                                                          'criteria': 'greater than or equal to',
-                                                                          'value':    1,
-                                                                          'format':   fWRONG})
-    
-    FDiff_start = xl_rowcol_to_cell(1, d['Full_List'].columns.get_loc('Difference Start [s]')+1, row_abs=True, col_abs=True)
-    FDiff_end = xl_rowcol_to_cell(d['Full_List'].shape[0]+1, d['Full_List'].columns.get_loc('Difference Start [s]')+1, row_abs=True, col_abs=True)
-    w['Full_List'].conditional_format('%s:%s' % (FDiff_start, FDiff_end), {'type':     'cell',
-                                                                          'criteria': 'greater than',
-                                                                          'value':    0,
-                                                                          'format':   fWRONG})
-    
-    FFilename_start = xl_rowcol_to_cell(1, d['Full_List'].columns.get_loc('Sensor FileName')+1, row_abs=True, col_abs=True)
-    FFilename_end = xl_rowcol_to_cell(d['Full_List'].shape[0]+1, d['Full_List'].columns.get_loc('Sensor FileName')+1, row_abs=True, col_abs=True)
-    w['Full_List'].conditional_format('%s:%s' % (FFilename_start, FFilename_end), {'type': 'text',
-                                                                                    'criteria': 'containing',
-                                                                                    'value':    '[WRONG]',
-                                                                                    #'criteria': '=NOT(ISNUMBER(SEARCH($E2,F2)))',
-                                                                                    'format': fWRONG})
-    w['Full_List'].conditional_format('%s:%s' % (FFilename_start, FFilename_end), {'type': 'text',
-                                                                                    'criteria': 'containing',
-                                                                                    'value':    '[OK]',
-                                                                                    'format': fOK})
-    
-    ListFC = [w['List_Transposed'], w['MBES_NotMatching'], w['SSS_NotMatching'], w['SBP_NotMatching'], 
-              w['MAG_NotMatching'], w['SUHRS_NotMatching']]
+    if name == 'Full_List':
+        FMaxGap_start = xl_rowcol_to_cell(1, columns.get_loc('Session MaxGap')+1, row_abs=True, col_abs=True)
+        FMaxGap_end = xl_rowcol_to_cell(nrows+1, columns.get_loc('Session MaxGap')+1, row_abs=True, col_abs=True)
+        ws.conditional_format('%s:%s' % (FMaxGap_start, FMaxGap_end), {'type':     'cell',
+                                                                  'criteria': 'greater than or equal to',
+                                                                  'value':    1,
+                                                                  'format':   fWRONG})
 
-    # Define our range for the color formatting
-    MaxGap_start = xl_rowcol_to_cell(1, d['List_Transposed'].columns.get_loc('Session MaxGap')+1, row_abs=True, col_abs=True)
-    MaxGap_end = xl_rowcol_to_cell(d['List_Transposed'].shape[0]+1, d['List_Transposed'].columns.get_loc('Session MaxGap')+1, row_abs=True, col_abs=True)
-    
-    SPL_start = xl_rowcol_to_cell(1, d['List_Transposed'].columns.get_loc('SPL')+1, row_abs=True, col_abs=True)
-    SPL_end = xl_rowcol_to_cell(d['List_Transposed'].shape[0]+1, d['List_Transposed'].columns.get_loc('SPL')+1, row_abs=True, col_abs=True)
-    
-    Sensors_start = xl_rowcol_to_cell(1, d['List_Transposed'].columns.get_loc('SPL')+2, row_abs=True, col_abs=True)
-    Sensors_end = xl_rowcol_to_cell(d['List_Transposed'].shape[0]+1, d['List_Transposed'].shape[1], row_abs=True, col_abs=True)
-    
-    for i in ListFC:
-        i.conditional_format('%s:%s' % (MaxGap_start, MaxGap_end), {'type':     'cell',
-                                                                    'criteria': 'greater than or equal to',
-                                                                    'value':    1,
-                                                                    'format':   fWRONG})
-        
-        i.conditional_format('%s:%s' % (SPL_start, SPL_end), {'type': 'text',
-                                                                'criteria': 'containing',
-                                                                'value':    'SPLtoSmall',
-                                                                'format': fWSPL})
-        i.conditional_format('%s:%s' % (SPL_start, SPL_end), {'type': 'text',
-                                                                'criteria': 'containing',
-                                                                'value':    'NoLineNameFound',
-                                                                'format': fWSPL})
-        i.conditional_format('%s:%s' % (SPL_start, SPL_end), {'type': 'text',
-                                                                'criteria': 'containing',
-                                                                'value':    'EmptySPL',
-                                                                'format': fWSPL})
-        i.conditional_format('%s:%s' % (SPL_start, SPL_end), {'type': 'duplicate',
-                                                                'format': fDUPL})
-        
-        i.conditional_format('%s:%s' % (Sensors_start, Sensors_end), {'type': 'blanks',
-                                                                        'format': fBLANK})
-        i.conditional_format('%s:%s' % (Sensors_start, Sensors_end), {'type': 'text',
-                                                                        'criteria': 'containing',
-                                                                        'value':    '[WRONG]',
-                                                                        #'criteria': '=NOT(ISNUMBER(SEARCH($E2,F2)))',
-                                                                        'format': fWRONG})
-        i.conditional_format('%s:%s' % (Sensors_start, Sensors_end), {'type': 'text',
-                                                                        'criteria': 'containing',
-                                                                        'value':    '[OK]',
-                                                                        'format': fOK}) 
+        FDiff_start = xl_rowcol_to_cell(1, columns.get_loc('Difference Start [s]')+1, row_abs=True, col_abs=True)
+        FDiff_end = xl_rowcol_to_cell(nrows+1, columns.get_loc('Difference Start [s]')+1, row_abs=True, col_abs=True)
+        ws.conditional_format('%s:%s' % (FDiff_start, FDiff_end), {'type':     'cell',
+                                                                  'criteria': 'greater than',
+                                                                  'value':    0,
+                                                                  'format':   fWRONG})
 
-    # Close the Pandas Excel writer and output the Excel file.
-    writer.save() 
+        FFilename_start = xl_rowcol_to_cell(1, columns.get_loc('Sensor FileName')+1, row_abs=True, col_abs=True)
+        FFilename_end = xl_rowcol_to_cell(nrows+1, columns.get_loc('Sensor FileName')+1, row_abs=True, col_abs=True)
+        ws.conditional_format('%s:%s' % (FFilename_start, FFilename_end), {'type': 'text',
+                                                                            'criteria': 'containing',
+                                                                            'value':    '[WRONG]',
+                                                                            #'criteria': '=NOT(ISNUMBER(SEARCH($E2,F2)))',
+                                                                            'format': fWRONG})
+        ws.conditional_format('%s:%s' % (FFilename_start, FFilename_end), {'type': 'text',
+                                                                            'criteria': 'containing',
+                                                                            'value':    '[OK]',
+                                                                            'format': fOK})
 
+    elif name in TRANSPOSED_SHEETS:
+        # Define our range for the color formatting
+        MaxGap_start = xl_rowcol_to_cell(1, columns.get_loc('Session MaxGap')+1, row_abs=True, col_abs=True)
+        MaxGap_end = xl_rowcol_to_cell(nrows+1, columns.get_loc('Session MaxGap')+1, row_abs=True, col_abs=True)
 
-# https://stackoverflow.com/questions/48780464/how-to-combine-multiple-excel-files-having-multiple-equal-number-of-sheets-in-ea
-def combine_excel_to_dfs(excel_names, sheet_name):
-    sheet_frames = [pd.read_excel(x, sheet_name=sheet_name, engine='openpyxl') for x in excel_names]
-    combined_df = pd.concat(sheet_frames)
+        SPL_start = xl_rowcol_to_cell(1, columns.get_loc('SPL')+1, row_abs=True, col_abs=True)
+        SPL_end = xl_rowcol_to_cell(nrows+1, columns.get_loc('SPL')+1, row_abs=True, col_abs=True)
+
+        Sensors_start = xl_rowcol_to_cell(1, columns.get_loc('SPL')+2, row_abs=True, col_abs=True)
+        Sensors_end = xl_rowcol_to_cell(nrows+1, len(columns), row_abs=True, col_abs=True)
+
+        ws.conditional_format('%s:%s' % (MaxGap_start, MaxGap_end), {'type':     'cell',
+                                                                     'criteria': 'greater than or equal to',
+                                                                     'value':    1,
+                                                                     'format':   fWRONG})
+
+        ws.conditional_format('%s:%s' % (SPL_start, SPL_end), {'type': 'text',
+                                                                 'criteria': 'containing',
+                                                                 'value':    'SPLtoSmall',
+                                                                 'format': fWSPL})
+        ws.conditional_format('%s:%s' % (SPL_start, SPL_end), {'type': 'text',
+                                                                 'criteria': 'containing',
+                                                                 'value':    'NoLineNameFound',
+                                                                 'format': fWSPL})
+        ws.conditional_format('%s:%s' % (SPL_start, SPL_end), {'type': 'text',
+                                                                 'criteria': 'containing',
+                                                                 'value':    'EmptySPL',
+                                                                 'format': fWSPL})
+        ws.conditional_format('%s:%s' % (SPL_start, SPL_end), {'type': 'duplicate',
+                                                                 'format': fDUPL})
+
+        ws.conditional_format('%s:%s' % (Sensors_start, Sensors_end), {'type': 'blanks',
+                                                                         'format': fBLANK})
+        ws.conditional_format('%s:%s' % (Sensors_start, Sensors_end), {'type': 'text',
+                                                                         'criteria': 'containing',
+                                                                         'value':    '[WRONG]',
+                                                                         #'criteria': '=NOT(ISNUMBER(SEARCH($E2,F2)))',
+                                                                         'format': fWRONG})
+        ws.conditional_format('%s:%s' % (Sensors_start, Sensors_end), {'type': 'text',
+                                                                         'criteria': 'containing',
+                                                                         'value':    '[OK]',
+                                                                         'format': fOK})
+
+def open_log(excel_name):
+    """
+    Return what the readers can open: the path of a log, or a new buffer for a LogBuffer or a ZipLog.
+    """
+    if isinstance(excel_name, (LogBuffer, ZipLog)):
+        return excel_name.open()
+    return excel_name
+
+def log_path(excel_name):
+    """
+    Return the file on disk of a log: its path, or the archive of a ZipLog.
+    """
+    if isinstance(excel_name, ZipLog):
+        return excel_name.archive
+    return excel_name
+
+def get_sheet_names(excel_name):
+    """
+    Return the sheet names of a workbook from its metadata (xl/workbook.xml), without loading any cell.
+    """
+    with zipfile.ZipFile(open_log(excel_name)) as z:
+        root = ElementTree.fromstring(z.read('xl/workbook.xml'))
+    return [sheet.get('name') for sheet in root.iter('{%s}sheet' % XLSX_MAIN_NS)]
+
+def count_sheet_rows(excel_name):
+    """
+    Return {sheet_name: rows} of a workbook (header row included) from the dimension of each
+    worksheet, read at the start of the sheet XML. openpyxl counts the rows of a sheet without it.
+    """
+    rows = {}
+    with zipfile.ZipFile(open_log(excel_name)) as z:
+        root = ElementTree.fromstring(z.read('xl/workbook.xml'))
+        rels = ElementTree.fromstring(z.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id'): rel.get('Target') for rel in rels.iter('{%s}Relationship' % XLSX_PKG_REL_NS)}
+        for sheet in root.iter('{%s}sheet' % XLSX_MAIN_NS):
+            target = targets.get(sheet.get('{%s}id' % XLSX_REL_NS), '')
+            part = target.lstrip('/') if target.startswith('/') else 'xl/' + target
+            try:
+                with z.open(part) as xml:
+                    start = xml.read(4096).decode('utf-8', 'ignore')
+            except KeyError:
+                continue
+            match = re.search(r'<(?:\w+:)?dimension ref="[A-Z]+\d+(?::[A-Z]+(\d+))?"', start)
+            if match:
+                rows[sheet.get('name')] = int(match.group(1) or 1)
+    missing = [name for name in get_sheet_names(excel_name) if name not in rows]
+    if missing:
+        wb = openpyxl.load_workbook(open_log(excel_name), read_only=True)
+        try:
+            for name in missing:
+                rows[name] = sum(1 for row in wb[name].iter_rows(values_only=True))
+        finally:
+            wb.close()
+    return rows
+
+def get_sheet_columns(excel_name, sheet_names):
+    """
+    Return {sheet_name: columns} from the header row of the sheets, without the index column.
+    """
+    wb = openpyxl.load_workbook(open_log(excel_name), read_only=True)
+    try:
+        return {name: list(next(wb[name].iter_rows(max_row=1, values_only=True), (None,))[1:])
+                for name in sheet_names if name in wb.sheetnames}
+    finally:
+        wb.close()
+
+def read_excel_sheets(excel_name, sheet_names=None, profiler=None, engine='openpyxl'):
+    """
+    Open the workbook once with the reader engine and read all the sheets (or the listed ones)
+    in a single pass. Return a dict {sheet_name: DataFrame}.
+    """
+    profiler = profiler or NO_PROFILER
+    sheets = {}
+    with profiler.stage('read_file', file=excel_name):
+        with pd.ExcelFile(open_log(excel_name), engine=engine) as xl:
+            if sheet_names is None:
+                sheet_names = xl.sheet_names
+            for name in sheet_names:
+                with profiler.stage('read_sheet', file=excel_name, sheet=name) as info:
+                    sheets[name] = apply_schema(name, xl.parse(name), excel_name)
+                    info.update(rows=sheets[name].shape[0], columns=sheets[name].shape[1])
+    return sheets
+
+def read_excel_sheets_worker(excel_name, sheet_names=None, profile=False, engine='openpyxl'):
+    """
+    read_excel_sheets() for the process pool. Return the sheets and the profile records of the worker.
+    """
+    profiler = Profiler(enabled=profile).start()
+    sheets = read_excel_sheets(excel_name, sheet_names, profiler, engine)
+    profiler.stop()
+    return sheets, profiler.records
+
+def apply_schema(sheet_name, df, source=None):
+    """
+    Return df with the dtypes of COLUMN_DTYPES. A column that can not be converted without
+    losing values is kept as read; the drift from the schema is reported as a warning. The
+    category columns mixing numbers and text are read as text.
+    """
+    missing = [col for col in SHEET_SCHEMAS.get(sheet_name, []) if col not in df.columns]
+    if missing:
+        warnings.warn(f'{source} [{sheet_name}]: missing columns {missing}', SchemaDriftWarning)
+    for col in df.columns:
+        dtype = COLUMN_DTYPES.get(col)
+        if dtype is None or str(df[col].dtype).startswith(dtype):
+            continue
+        values = df[col]
+        if dtype == 'datetime64':
+            converted = pd.to_datetime(values, errors='coerce')
+        elif dtype == 'float64':
+            converted = pd.to_numeric(values, errors='coerce').astype('float64')
+        elif pd.api.types.infer_dtype(values, skipna=True).startswith('mixed'):
+            # Numbers and text (e.g. Session Name 61100 and S61100): categories of one kind, as text
+            converted = values.where(values.isna(), values.astype(str)).astype('category')
+        else:
+            converted = values.astype('category')
+        lost = int((converted.isna() & values.notna()).sum())
+        if lost:
+            warnings.warn(f'{source} [{sheet_name}] {col}: {lost} values are not {dtype}, column kept as read', SchemaDriftWarning)
+            continue
+        df[col] = converted
+    return df
+
+def concat_frames(sheet_frames):
+    """
+    pd.concat of the frames keeping the columns categorical in all the (not empty) frames: the
+    merged categories are built once with union_categoricals. The categories of different kinds
+    (e.g. numbers in a log, text in another) are not unified, the column is merged as object.
+    """
+    frames = list(sheet_frames)
+    combined_df = pd.concat(frames)
+    parts = [df for df in frames if len(df)]
+    for col in combined_df.columns:
+        if not parts or not all(col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype) for df in parts):
+            continue
+        try:
+            combined_df[col] = union_categoricals([df[col] for df in parts])
+        except TypeError:
+            combined_df[col] = combined_df[col].astype(object)
+    return combined_df
+
+def concat_sheet_frames(sheet_frames):
+    """
+    Concatenate the frames of the same sheet and drop the index column written by splsensors.
+    """
+    combined_df = concat_frames(sheet_frames)
     combined_df = combined_df.drop(combined_df.columns[0], axis=1)
     return combined_df
 
+def combine_excel_files(excel_names, sheet_names, jobs=1, cache=None, profiler=None, reader=None, engine='openpyxl'):
+    """
+    Read every file only once and return a dict {sheet_name: combined DataFrame}.
+    With jobs > 1 the files are parsed in a process pool; the results are kept in
+    the excel_names order so the output is the same as the serial reading.
+    With a ParseCache only the files not already in the cache are parsed.
+    With a PoolReader (batch mode) the files are read in its shared pool.
+    """
+    profiler = profiler or NO_PROFILER
+    parsed = {}
+    if cache is not None:
+        with profiler.stage('cache_load') as info:
+            keys = {x: cache.key(x) for x in excel_names}
+            for x in excel_names:
+                sheets = cache.get(keys[x], sheet_names)
+                if sheets is not None:
+                    parsed[x] = sheets
+            info['files'] = len(parsed)
+        print(f'{len(parsed)} of {len(excel_names)} files loaded from the cache.', flush=True)
+    to_parse = [x for x in excel_names if x not in parsed]
+
+    jobs = min(jobs or 1, len(to_parse))
+    with profiler.stage('read', files=len(to_parse), jobs=max(jobs, 1)):
+        if reader is not None:
+            for x in to_parse:
+                parsed[x], records = reader.read(x, sheet_names)
+                profiler.extend(records, worker=True)
+        elif jobs > 1:
+            worker = functools.partial(read_excel_sheets_worker, sheet_names=sheet_names, profile=profiler.enabled,
+                                       engine=engine)
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                for x, (sheets, records) in zip(to_parse, executor.map(worker, to_parse)):
+                    parsed[x] = sheets
+                    profiler.extend(records, worker=True)
+        else:
+            parsed.update((x, read_excel_sheets(x, sheet_names, profiler, engine)) for x in to_parse)
+
+    if cache is not None:
+        with profiler.stage('cache_save', files=len(to_parse)):
+            for x in to_parse:
+                cache.put(keys[x], x, parsed[x])
+            cache.save()
+
+    file_sheets = [parsed[x] for x in excel_names]
+    combined = {}
+    for name in sheet_names:
+        columns = list(file_sheets[0][name].columns)
+        for x, sheets in zip(excel_names[1:], file_sheets[1:]):
+            if list(sheets[name].columns) != columns:
+                warnings.warn(f'{x} [{name}]: columns differ from {excel_names[0]}', SchemaDriftWarning)
+        with profiler.stage('concat', sheet=name) as info:
+            combined[name] = concat_sheet_frames([sheets[name] for sheets in file_sheets])
+            info.update(rows=combined[name].shape[0], columns=combined[name].shape[1])
+    return combined
+
+# https://stackoverflow.com/questions/48780464/how-to-combine-multiple-excel-files-having-multiple-equal-number-of-sheets-in-ea
+def combine_excel_to_dfs(excel_names, sheet_name, engine='openpyxl'):
+    return combine_excel_files(excel_names, [sheet_name], engine=engine)[sheet_name]
+
+def sheets_to_read(sheet_names, derive=False):
+    """
+    Return the sheets read from the logs: all but the Summary_Process_Log, and with derive
+    not the DERIVED_SHEETS (computed from Full_List).
+    """
+    derive = derive and 'Full_List' in sheet_names
+    return [name for name in sheet_names if name != 'Summary_Process_Log' and not (derive and name in DERIVED_SHEETS)]
+
+def combine_logs(excel_names, sheet_names, derive=False, **kwargs):
+    """
+    Return the dict {sheet_name: merged DataFrame} of the logs (without the Summary_Process_Log).
+    With derive the DERIVED_SHEETS are computed from the merged Full_List, with the column
+    layout of the first log. kwargs are given to combine_excel_files().
+    """
+    combined = combine_excel_files(excel_names, sheets_to_read(sheet_names, derive), **kwargs)
+    derived = [name for name in sheet_names if name in DERIVED_SHEETS and name not in combined]
+    if derive and 'Full_List' in combined:
+        profiler = kwargs.get('profiler') or NO_PROFILER
+        with profiler.stage('derive', sheets=len(derived)):
+            combined.update(derive_sheets(combined, get_sheet_columns(excel_names[0], derived)))
+    return {name: combined[name] for name in sheet_names if name in combined}
+
+def derive_sheets(combined, layouts):
+    """
+    Compute the sheets of layouts {sheet_name: columns} from the merged Full_List, and add the
+    sensor files found in several logs to Duplicated_Sensor_Data.
+    The transposed sheets have one row for each session (SESSION_KEYS), given by its first
+    Full_List row, with the files of each sensor type in the column of the sensor (a file
+    found in several logs only once).
+    """
+    full = combined['Full_List'].reset_index(drop=True)
+    d = {}
+    # Each log only knows its own duplicates, the same sensor file can also be in several logs
+    acrossLogs = full.iloc[:0]
+    if all(col in full.columns for col in SENSOR_FILE_KEYS):
+        acrossLogs = full[full.duplicated(SENSOR_FILE_KEYS, keep=False)]
+        full = full[~full.duplicated(SENSOR_FILE_KEYS)].reset_index(drop=True)
+    keys = [col for col in SESSION_KEYS if col in full.columns]
+    session = full.groupby(keys, sort=False, dropna=False, observed=True).ngroup()
+    first = ~session.duplicated()
+    sessions = full.loc[first].set_axis(session[first]).rename(columns={'SPL LineName': 'SPL'})
+    fileNames = full['Sensor FileName'].astype(str)
+    sensors = full['Sensor Type'].astype(str)
+    files = fileNames.groupby([session, sensors], sort=False).agg('\n'.join).unstack()
+    transposed = sessions.drop(columns=files.columns, errors='ignore').join(files)
+    # Files without the SPL line name in their name
+    notMatching = pd.Series([str(line) not in name for line, name in zip(full['SPL LineName'], fileNames)])
+    spl = transposed['SPL']
+    problem = spl.isna() | spl.isin(SPL_PROBLEMS)
+
+    for name, columns in layouts.items():
+        if name == 'List_Transposed':
+            df = transposed
+        elif name in TRANSPOSED_SHEETS:
+            sensor = name[:-len('_NotMatching')]
+            df = transposed[transposed.index.isin(session[notMatching & (sensors == sensor)])]
+        elif name == 'Duplicated_SPL_Name':
+            df = transposed[spl.duplicated(keep=False) & ~problem]
+        elif name == 'SPL_Problem':
+            df = transposed[problem]
+        d[name] = df.reindex(columns=columns).reset_index(drop=True)
+
+    if 'Duplicated_Sensor_Data' in combined and not acrossLogs.empty:
+        duplicated = combined['Duplicated_Sensor_Data']
+        across = acrossLogs.reindex(columns=duplicated.columns)
+        d['Duplicated_Sensor_Data'] = concat_frames([duplicated, across]).drop_duplicates().reset_index(drop=True)
+    return d
+
+
+class LogBuffer(object):
+    """
+    A log given as bytes (merge_logs). It is used like a path by the readers: picklable for the
+    process pool, str() is the name shown in the messages and a new buffer is opened for each read.
+    """
+    def __init__(self, data, name):
+        self.data = data
+        self.name = name
+
+    def open(self):
+        return io.BytesIO(self.data)
+
+    def __str__(self):
+        return self.name
+
+    __repr__ = __str__
+
+
+class ZipLog(object):
+    """
+    A log in a zip archive, read without extraction: the member is decompressed in memory for
+    each read. Picklable for the process pool, and equal to the ZipLog of the same member so it
+    can be scheduled in the PoolReader and found again by the merge.
+    """
+    def __init__(self, archive, member, size=None, crc=None):
+        self.archive = archive
+        self.member = member
+        self.size = size
+        self.crc = crc
+
+    def open(self):
+        with zipfile.ZipFile(self.archive) as z:
+            return io.BytesIO(z.read(self.member))
+
+    def key(self):
+        """
+        Identity of the member content from the central directory: size and CRC-32.
+        """
+        return (os.path.abspath(self.archive), self.member, self.size, self.crc)
+
+    def __eq__(self, other):
+        return isinstance(other, ZipLog) and (self.archive, self.member) == (other.archive, other.member)
+
+    def __hash__(self):
+        return hash((self.archive, self.member))
+
+    def __str__(self):
+        return os.path.join(self.archive, self.member)
+
+    __repr__ = __str__
+
+
+class PoolReader(object):
+    """
+    Read the logs of several projects in one shared process pool (batch mode).
+    The scheduled files are submitted in order, with up to `window` files in flight
+    ahead of the one being merged, so the memory used by the parsed sheets is bounded.
+    """
+    def __init__(self, executor, window, profile=False, engine='openpyxl'):
+        self.executor = executor
+        self.window = window
+        self.profile = profile
+        self.engine = engine
+        self.queue = collections.OrderedDict() # {excel_name: sheet_names} not yet submitted
+        self.futures = {}
+
+    def schedule(self, excel_names, sheet_names):
+        for excel_name in excel_names:
+            self.queue[excel_name] = sheet_names
+        self._fill()
+
+    def _submit(self, excel_name, sheet_names):
+        self.futures[excel_name] = self.executor.submit(read_excel_sheets_worker, excel_name, sheet_names, self.profile,
+                                                    self.engine)
+
+    def _fill(self):
+        while self.queue and len(self.futures) < self.window:
+            self._submit(*self.queue.popitem(last=False))
+
+    def read(self, excel_name, sheet_names):
+        """
+        Return the sheets and the profile records of a log, as read_excel_sheets_worker().
+        """
+        if excel_name not in self.futures:
+            self.queue.pop(excel_name, None)
+            self._submit(excel_name, sheet_names)
+        sheets, records = self.futures.pop(excel_name).result()
+        self._fill()
+        return sheets, records
+
+    def discard(self, excel_names):
+        """
+        Drop the reads of a failed project: the queued ones and the futures (cancelled if not started),
+        so their sheets are not kept in memory and the window is free for the next projects.
+        """
+        for excel_name in excel_names:
+            self.queue.pop(excel_name, None)
+            future = self.futures.pop(excel_name, None)
+            if future is not None:
+                future.cancel()
+        self._fill()
+
+
+##########################################################
+#                 Profiling of the process               #
+##########################################################
+class Profiler(object):
+    """
+    Record the wall time and the peak memory (tracemalloc) of each stage of the process.
+    The stages can be nested; the peak of a stage includes the peak of its sub stages.
+    A disabled profiler records nothing.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.records = []
+        self._stack = []
+        self._started = False
+        self._t0 = time.time()
+
+    def start(self):
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        return self
+
+    def stop(self):
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    @contextlib.contextmanager
+    def stage(self, name, **info):
+        """
+        Context manager timing a stage. The yielded dict can be updated with more info (rows, columns...).
+        """
+        if not self.enabled:
+            yield info
+            return
+        # Keep the peak of the parent stage before the reset
+        if self._stack:
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        current = {'peak': 0}
+        self._stack.append(current)
+        start_time = time.time() # wall clock, comparable with the records of the workers
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            seconds = time.perf_counter() - start
+            self._stack.pop()
+            peak = max(current['peak'], tracemalloc.get_traced_memory()[1])
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            self.records.append(dict(stage=name, start=start_time, seconds=seconds,
+                                     peak_mb=peak / 1024 / 1024, **info))
+
+    def extend(self, records, **info):
+        """
+        Add the records of a sub process (e.g. the files read in the process pool).
+        """
+        if self.enabled:
+            self.records.extend(dict(record, **info) for record in records)
+
+    def sorted_records(self):
+        """
+        Return the records sorted by start time, in seconds from the start of the profiler.
+        """
+        return [dict(record, start=record['start'] - self._t0) for record in sorted(self.records, key=lambda r: r['start'])]
+
+    def summary(self):
+        """
+        Print the time and peak memory by stage, and the size of each merged sheet.
+        """
+        df = pd.DataFrame(self.sorted_records())
+        if df.empty:
+            return
+        stages = df.groupby('stage', sort=False).agg(count=('seconds', 'size'), total_s=('seconds', 'sum'),
+                                                   max_s=('seconds', 'max'), peak_mb=('peak_mb', 'max'))
+        print('', flush=True)
+        print(stages.round(3).to_string(), flush=True)
+        if (df['stage'] == 'concat').any():
+            sheets = df[df['stage'] == 'concat'].set_index('sheet')[['rows', 'columns', 'seconds']]
+            sheets = sheets.astype({'rows': int, 'columns': int})
+            sheets = sheets.join(df[df['stage'] == 'to_excel'].set_index('sheet')[['seconds']], rsuffix='_to_excel')
+            print('', flush=True)
+            print(sheets.round(3).to_string(), flush=True)
+        files = df[df['stage'].isin(['read_file', 'stream_file'])]
+        if not files.empty:
+            files = files.nlargest(10, 'seconds').set_index('file')[['seconds', 'peak_mb']]
+            print('', flush=True)
+            print('Slowest files:', flush=True)
+            print(files.round(3).to_string(), flush=True)
+
+    def report(self, reportFile, **info):
+        """
+        Save all the records as a JSON report.
+        """
+        report = dict(info, date=datetime.datetime.now().isoformat(timespec='seconds'),
+                      total_seconds=time.time() - self._t0, stages=self.sorted_records())
+        with open(reportFile, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+
+NO_PROFILER = Profiler(enabled=False)
+
+
+##########################################################
+#                   Parsed logs cache                    #
+##########################################################
+class ParseCache(object):
+    """
+    Cache of the parsed sheets of each log, saved as feather files next to the combined spreadsheet.
+    The entries are keyed by the path, size, mtime and content hash of the log, so only the new or
+    modified logs need to be read again (the entry of the previous content is removed). The cache is
+    limited to max_size bytes (least recently used entries are removed first) and the entries of the
+    logs that do not exist anymore are removed.
+    """
+    def __init__(self, folder, max_size=500 * 1024 * 1024):
+        self.folder = folder
+        self.max_size = max_size
+        self.index_file = os.path.join(folder, 'index.json')
+        self._keys = {}
+        os.makedirs(folder, exist_ok=True)
+        try:
+            with open(self.index_file, 'r') as f:
+                self.entries = json.load(f)
+        except (IOError, ValueError):
+            self.entries = {}
+
+    def key(self, excel_name):
+        """
+        Return the cache key of a log. The content of a ZipLog is identified by its size and CRC.
+        """
+        if isinstance(excel_name, ZipLog):
+            ident = '|'.join([str(value) for value in excel_name.key()] + [SCHEMA_VERSION])
+            return hashlib.sha1(ident.encode('utf-8')).hexdigest()
+        st = os.stat(excel_name)
+        stat_key = (os.path.abspath(excel_name), st.st_size, st.st_mtime_ns)
+        if stat_key in self._keys: # already hashed in this run
+            return self._keys[stat_key]
+        content = hashlib.sha1()
+        with open(excel_name, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                content.update(chunk)
+        ident = '|'.join([os.path.abspath(excel_name), str(st.st_size), str(st.st_mtime_ns), content.hexdigest(), SCHEMA_VERSION])
+        self._keys[stat_key] = hashlib.sha1(ident.encode('utf-8')).hexdigest()
+        return self._keys[stat_key]
+
+    def has(self, key, sheet_names):
+        entry = self.entries.get(key)
+        return entry is not None and all(name in entry['sheets'] for name in sheet_names)
+
+    def _sheet_file(self, key, n):
+        return os.path.join(self.folder, '%s_%d.feather' % (key, n))
+
+    def get(self, key, sheet_names):
+        """
+        Return the dict {sheet_name: DataFrame} of a log or None if it is not (fully) in the cache.
+        """
+        if not self.has(key, sheet_names):
+            return None
+        entry = self.entries[key]
+        try:
+            sheets = {name: pd.read_feather(self._sheet_file(key, entry['sheets'].index(name))) for name in sheet_names}
+        except (IOError, ValueError, pyarrow.ArrowException):
+            self.remove(key)
+            return None
+        entry['used'] = time.time()
+        return sheets
+
+    def put(self, key, excel_name, sheets):
+        """
+        Save the parsed sheets of a log. The logs with columns that can not be stored are skipped.
+        The entry of the previous content of the log (modified or replaced) is removed.
+        """
+        names = list(sheets.keys())
+        try:
+            for n, name in enumerate(names):
+                sheets[name].to_feather(self._sheet_file(key, n))
+        except (ValueError, TypeError, pyarrow.ArrowException) as e:
+            print(f'Cache skipped for {excel_name}: {e}', flush=True)
+            self._remove_files(key, len(names))
+            return
+        nbytes = sum(os.path.getsize(self._sheet_file(key, n)) for n in range(len(names)))
+        path = os.path.abspath(log_path(excel_name))
+        member = excel_name.member if isinstance(excel_name, ZipLog) else None
+        for old, entry in list(self.entries.items()):
+            if old != key and entry['path'] == path and entry.get('member') == member:
+                self.remove(old)
+        self.entries[key] = {'path': path, 'member': member, 'sheets': names, 'nbytes': nbytes, 'used': time.time()}
+
+    def _remove_files(self, key, count):
+        for n in range(count):
+            if os.path.exists(self._sheet_file(key, n)):
+                os.remove(self._sheet_file(key, n))
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self._remove_files(key, len(entry['sheets']))
+
+    def prune(self):
+        """
+        Remove the entries of the deleted logs, then the least recently used ones above max_size.
+        """
+        for key, entry in list(self.entries.items()):
+            if not os.path.exists(entry['path']):
+                self.remove(key)
+        total = sum(entry['nbytes'] for entry in self.entries.values())
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1]['used']):
+            if total <= self.max_size:
+                break
+            total -= entry['nbytes']
+            self.remove(key)
+
+    def save(self):
+        """
+        Prune and write the cache index.
+        """
+        self.prune()
+        tmp = self.index_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.index_file)
+
+
+class MemoryCache(object):
+    """
+    In memory cache of the parsed logs used by the watch mode, same interface than ParseCache.
+    The entries are keyed by the path, size and mtime of the logs (size and CRC for a ZipLog).
+    """
+    def __init__(self):
+        self.entries = {}
+        self.used = set()
+
+    def key(self, excel_name):
+        if isinstance(excel_name, ZipLog):
+            return excel_name.key()
+        st = os.stat(excel_name)
+        return (os.path.abspath(excel_name), st.st_size, st.st_mtime_ns)
+
+    def has(self, key, sheet_names):
+        return key in self.entries and all(name in self.entries[key] for name in sheet_names)
+
+    def get(self, key, sheet_names):
+        self.used.add(key)
+        if not self.has(key, sheet_names):
+            return None
+        return {name: self.entries[key][name] for name in sheet_names}
+
+    def put(self, key, excel_name, sheets):
+        self.used.add(key)
+        self.entries[key] = sheets
+
+    def save(self):
+        """
+        Remove the entries of the deleted or modified logs (not used by the last merge).
+        """
+        for key in list(self.entries):
+            if key not in self.used:
+                del self.entries[key]
+        self.used = set()
+
 
 ##########################################################
 #                        __main__                        #
 ########################################################## 
 if __name__ == "__main__":
-    now = datetime.datetime.now() # time the process
+    multiprocessing.freeze_support() # needed by the process pool in the pyinstaller executable
     main()
-    print('', flush=True)
-    print("Process Duration: ", (datetime.datetime.now() - now), flush=True) # print the processing time. It is handy to keep an eye on processing performance.
\ No newline at end of file
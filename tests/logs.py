@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Small splsensors Final logs written for the tests.
+"""
+import functools
+from datetime import datetime
+
+import pandas as pd
+
+SENSORS = ['MBES', 'SSS', 'SBP', 'MAG', 'SUHRS']
+TRANSPOSED_COLUMNS = ['Session Start', 'Session End', 'Session Name', 'Session MaxGap', 'Vessel Name', 'SPL'] + SENSORS
+SESSION_COLUMNS = ['Session Start', 'Session End', 'Session Name', 'SPL']
+FULL_LIST_COLUMNS = ['Sensor Start', 'SPL Start', 'Session Start', 'Session End', 'Session Name', 'Session MaxGap',
+                     'Difference Start [s]', 'Vessel Name', 'Sensor Type', 'FilePath', 'Sensor FileName',
+                     'SPL LineName', 'SPL Name']
+
+# Sessions of the log: (start, end, name, max gap, SPL line name)
+SESSIONS = [
+    (datetime(2020, 3, 1, 10, 0), datetime(2020, 3, 1, 10, 40), 61100, 0.5, 'L0001'),
+    (datetime(2020, 3, 1, 11, 0), datetime(2020, 3, 1, 11, 30), 61110, 0.2, 'L0002'),
+    (datetime(2020, 3, 1, 12, 0), datetime(2020, 3, 1, 12, 20), 61120, 1.5, 'NoLineNameFound'),
+    (datetime(2020, 3, 1, 13, 0), datetime(2020, 3, 1, 13, 50), 61130, 0.1, 'L0001'),
+    (datetime(2020, 3, 1, 14, 0), datetime(2020, 3, 1, 14, 10), 61140, 0.0, 'EmptySPL'),
+]
+# Sensor files of the log: (session, sensor type, start, file name)
+FILES = [
+    (0, 'MBES', datetime(2020, 3, 1, 10, 1), '[OK] FSV01_L0001_20200301_100100.all'),
+    (0, 'MBES', datetime(2020, 3, 1, 10, 20), '[OK] FSV01_L0001_20200301_102000.all'),
+    (0, 'SSS', datetime(2020, 3, 1, 10, 2), '[OK] FSV01_L0001_20200301_100200.xtf'),
+    (1, 'MBES', datetime(2020, 3, 1, 11, 1), '[OK] FSV01_L0002_20200301_110100.all'),
+    (1, 'SBP', datetime(2020, 3, 1, 11, 2), '[WRONG] FSV01_L0020_20200301_110200.sgy'),
+    (2, 'MAG', datetime(2020, 3, 1, 12, 1), '[WRONG] FSV01_20200301_120100.csv'),
+    (3, 'MBES', datetime(2020, 3, 1, 13, 1), '[OK] FSV01_L0001_20200301_130100.all'),
+    (3, 'SUHRS', datetime(2020, 3, 1, 13, 2), '[WRONG] FSV01_L001_20200301_130200.xtf'),
+    (4, 'SSS', datetime(2020, 3, 1, 14, 1), '[WRONG] FSV01_20200301_140100.xtf'),
+]
+
+
+def full_list(sessions=SESSIONS):
+    records = []
+    for session, sensor, start, filename in FILES:
+        sessionStart, sessionEnd, sessionName, maxGap, line = sessions[session]
+        records.append([start, sessionStart, sessionStart, sessionEnd, sessionName, maxGap,
+                        min(0.0, (sessionStart - start).total_seconds()), 'FSV01', sensor,
+                        'D:\\Survey\\FSV01\\%s\\%s' % (sensor, filename.split(' ')[1]), filename, line,
+                        'D:\\Survey\\FSV01\\SPL\\%s_FugroBrasilis-CRP-Position.fbz' % line])
+    return pd.DataFrame(records, columns=FULL_LIST_COLUMNS)
+
+
+def transposed_rows(rows, sessions=SESSIONS):
+    """
+    The List_Transposed rows of the sessions, as written by splsensors.
+    """
+    records = []
+    for session in rows:
+        sessionStart, sessionEnd, sessionName, maxGap, line = sessions[session]
+        files = {sensor: '\n'.join(f for s, t, _, f in FILES if s == session and t == sensor) or None
+                 for sensor in SENSORS}
+        records.append([sessionStart, sessionEnd, sessionName, maxGap, 'FSV01', line] + [files[s] for s in SENSORS])
+    return pd.DataFrame(records, columns=TRANSPOSED_COLUMNS)
+
+
+def write_log(path, sessions=SESSIONS):
+    """
+    Write a Final log of the sessions, with the sheets of splsensors.
+    """
+    transposed = functools.partial(transposed_rows, sessions=sessions)
+    sheets = {
+        'Summary_Process_Log': pd.DataFrame({'Process Log': ['Test log']}),
+        'Full_List': full_list(sessions),
+        'List_Transposed': transposed([0, 1, 2, 3, 4]),
+        'MBES_NotMatching': transposed([]),
+        'SSS_NotMatching': transposed([4]),
+        'SBP_NotMatching': transposed([1]),
+        'MAG_NotMatching': transposed([2]),
+        'SUHRS_NotMatching': transposed([3]),
+        'Duplicated_SPL_Name': transposed([0, 3])[SESSION_COLUMNS],
+        'Duplicated_Sensor_Data': pd.DataFrame(columns=['Sensor Start', 'Sensor FileName', 'Sensor Type', 'FilePath']),
+        'SPL_Problem': transposed([2, 4])[SESSION_COLUMNS],
+    }
+    with pd.ExcelWriter(path, engine='xlsxwriter') as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Parse cache: keys of the logs, invalidation of the modified and deleted logs, LRU eviction.
+"""
+import os
+import glob
+import shutil
+import tempfile
+import unittest
+
+from mergexlsxspl import mergexlsxspl
+
+from .logs import SESSIONS, write_log
+
+SHEETS = ['Full_List', 'List_Transposed']
+
+
+@unittest.skipIf(mergexlsxspl.pyarrow is None, 'pyarrow is not installed')
+class ParseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cacheFolder = os.path.join(self.folder, 'cache')
+        self.logs = [os.path.join(self.folder, 'FSV01_%s_FINAL_Log.xlsx' % n) for n in 'AB']
+        for log in self.logs:
+            write_log(log)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def merge(self, logs, max_size=500 * 1024 * 1024):
+        cache = mergexlsxspl.ParseCache(self.cacheFolder, max_size)
+        mergexlsxspl.combine_excel_files(logs, SHEETS, cache=cache)
+        return cache
+
+    def feather_files(self):
+        return glob.glob(os.path.join(self.cacheFolder, '*.feather'))
+
+    def test_hit(self):
+        self.merge(self.logs)
+        cache = mergexlsxspl.ParseCache(self.cacheFolder)
+        for log in self.logs:
+            self.assertIsNotNone(cache.get(cache.key(log), SHEETS))
+
+    def test_modified(self):
+        self.merge(self.logs[:1])
+        cache = mergexlsxspl.ParseCache(self.cacheFolder)
+        old = cache.key(self.logs[0])
+        write_log(self.logs[0], [(start, end, 'S%d' % name, gap, line) for start, end, name, gap, line in SESSIONS])
+        cache = mergexlsxspl.ParseCache(self.cacheFolder)
+        self.assertNotEqual(cache.key(self.logs[0]), old)
+        self.assertIsNone(cache.get(cache.key(self.logs[0]), SHEETS))
+        cache = self.merge(self.logs[:1])
+        self.assertEqual(list(cache.entries), [cache.key(self.logs[0])])
+        self.assertEqual(len(self.feather_files()), len(SHEETS))
+
+    def test_deleted(self):
+        self.merge(self.logs)
+        os.remove(self.logs[0])
+        cache = self.merge(self.logs[1:])
+        self.assertEqual(list(cache.entries), [cache.key(self.logs[1])])
+        self.assertEqual(len(self.feather_files()), len(SHEETS))
+
+    def test_lru(self):
+        cache = self.merge(self.logs)
+        first, last = [cache.key(log) for log in self.logs]
+        cache.max_size = cache.entries[last]['nbytes']
+        cache.save()
+        self.assertEqual(list(cache.entries), [last])
+        self.assertEqual(list(mergexlsxspl.ParseCache(self.cacheFolder).entries), [last])
+        self.assertEqual(len(self.feather_files()), len(SHEETS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+--derive on a single log must give back the sheets written by splsensors in that log.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from mergexlsxspl import mergexlsxspl
+
+from .logs import write_log
+
+
+class DeriveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.log = os.path.join(self.folder, 'FSV01_FINAL_Log.xlsx')
+        write_log(self.log)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_derive_single_log(self):
+        read = mergexlsxspl.merge_logs(self.log, engine='openpyxl')
+        derived = mergexlsxspl.merge_logs(self.log, derive=True, engine='openpyxl')
+        self.assertEqual(list(read), list(derived))
+        for name in mergexlsxspl.DERIVED_SHEETS + ['Duplicated_Sensor_Data']:
+            with self.subTest(sheet=name):
+                pd.testing.assert_frame_equal(derived[name], read[name].reset_index(drop=True),
+                                              check_dtype=False, check_categorical=False, check_index_type=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
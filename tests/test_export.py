@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Logs with numbers and text in the same category column (Session Name): merge, --export and cache.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from mergexlsxspl import mergexlsxspl
+
+from .logs import SESSIONS, write_log
+
+# Session Name as text (S61100) in a log, and numbers and text in the same log
+TEXT_SESSIONS = [(start, end, 'S%d' % name, gap, line) for start, end, name, gap, line in SESSIONS]
+MIXED_SESSIONS = [text if n % 2 else number for n, (number, text) in enumerate(zip(SESSIONS, TEXT_SESSIONS))]
+
+
+@unittest.skipIf(mergexlsxspl.pyarrow is None, 'pyarrow is not installed')
+class MixedLogsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        write_log(os.path.join(self.folder, 'FSV01_A_FINAL_Log.xlsx'))
+        write_log(os.path.join(self.folder, 'FSV01_B_FINAL_Log.xlsx'), TEXT_SESSIONS)
+        write_log(os.path.join(self.folder, 'FSV01_C_FINAL_Log.xlsx'), MIXED_SESSIONS)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_merge(self):
+        d = mergexlsxspl.merge_logs(self.folder, engine='openpyxl')
+        names = [str(name) for name in d['List_Transposed']['Session Name']]
+        expected = [str(session[2]) for sessions in [SESSIONS, TEXT_SESSIONS, MIXED_SESSIONS] for session in sessions]
+        self.assertEqual(names, expected)
+        self.assertEqual(d['Full_List']['Sensor Type'].dtype, 'category')
+
+    def test_export(self):
+        mergexlsxspl.process(inputFolder=self.folder, export='parquet')
+        self.assertTrue(os.path.exists(os.path.join(self.folder, 'sheets_combined.xlsx')))
+        df = pd.read_parquet(os.path.join(self.folder, 'sheets_combined', 'List_Transposed.parquet'))
+        self.assertEqual(list(df['Session Name'].astype(str)),
+                         [str(session[2]) for sessions in [SESSIONS, TEXT_SESSIONS, MIXED_SESSIONS] for session in sessions])
+
+    def test_cache(self):
+        cache = mergexlsxspl.ParseCache(os.path.join(self.folder, 'cache'))
+        logs = mergexlsxspl.find_logs(self.folder)
+        mergexlsxspl.combine_excel_files(logs, ['List_Transposed'], cache=cache)
+        self.assertEqual(len(cache.entries), len(logs))
+
+
+if __name__ == '__main__':
+    unittest.main()